@@ -3,54 +3,114 @@
 Basic settings used across the API.
 The values are loaded from environment variables so they can be changed
 without touching the code (handy for local dev vs. production).
+
+Everything is read once into a frozen `settings` object; import that
+instead of reaching into `os.environ` elsewhere.
 """
 import os
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Mapping, Optional, Tuple
 
 from dotenv import load_dotenv
 
-# Load values from a .env file sitting in the project root
-load_dotenv()
-
-# Database settings
-DB_DRIVER = os.getenv("DB_DRIVER", "postgres").lower()
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = int(os.getenv("DB_PORT", "5432"))
-DB_NAME = os.getenv("DB_NAME", "postgres")
-DB_USER = os.getenv("DB_USER", "postgres")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "mysecretpassword")
-SQLITE_PATH = os.getenv("SQLITE_PATH", str(Path("data") / "app.db"))
-
-# Qdrant (vector database) settings
-QDRANT_URL = os.getenv("QDRANT_URL")  # If unset, we'll use embedded mode
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-QDRANT_COLLECTION_NAME = os.getenv("QDRANT_COLLECTION_NAME", "supportbot_documents")
-QDRANT_PATH = os.getenv("QDRANT_PATH", str(Path("data") / "qdrant"))
-
-# OpenAI settings
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
-EMBEDDING_DIM = 1536
-CHAT_MODEL = os.getenv("OPENAI_CHAT_MODEL", "gpt-4.1-nano")
-
-# Search and chunking defaults
-TOP_K = 5
-MIN_SCORE = 0.35
-MAX_CHARS_PER_CHUNK = 1000
-MAX_CHUNKS_PER_FILE = 100_000
-SUPPORTED_EXTENSIONS = (".txt", ".pdf")
-
-# FastAPI app metadata and CORS
-APP_TITLE = "AI Chat Bot API"
-raw_origins = os.getenv("ALLOWED_ORIGINS")
-if raw_origins:
-    ALLOWED_ORIGINS = [origin.strip() for origin in raw_origins.split(",") if origin.strip()]
-else:
+# Load values from a .env file sitting in the project root. Production containers
+# get their env injected, so skip the upward .env search (and parse) there.
+if os.getenv("ENV", "").lower() not in ("prod", "production") and os.getenv("SKIP_DOTENV") != "1":
+    load_dotenv()
+
+
+def _parse_origins(raw: Optional[str]) -> Tuple[str, ...]:
+    if raw:
+        return tuple(origin.strip() for origin in raw.split(",") if origin.strip())
     # Default to permissive for co-located Streamlit/Backend deployments (e.g., Hugging Face Space)
-    ALLOWED_ORIGINS = ["*"]
+    return ("*",)
+
+
+@dataclass(frozen=True)
+class Settings:
+    # Database settings
+    db_driver: str = "postgres"
+    db_host: str = "localhost"
+    db_port: int = 5432
+    db_name: str = "postgres"
+    db_user: str = "postgres"
+    db_password: str = "mysecretpassword"
+    sqlite_path: str = str(Path("data") / "app.db")
+    db_pool_min: int = 10
+    db_pool_max: int = 50
+    db_pool_timeout: float = 30.0
+    sqlite_pool_size: int = 5
+
+    # Qdrant (vector database) settings
+    qdrant_url: Optional[str] = None  # If unset, we'll use embedded mode
+    qdrant_api_key: Optional[str] = None
+    qdrant_collection_name: str = "supportbot_documents"
+    qdrant_path: str = str(Path("data") / "qdrant")
+    qdrant_prefer_grpc: bool = False
+    qdrant_grpc_port: int = 6334
+    qdrant_timeout: int = 10
+
+    # OpenAI settings
+    openai_api_key: Optional[str] = None
+    embedding_model: str = "text-embedding-3-small"
+    embedding_dim: int = 1536
+    chat_model: str = "gpt-4.1-nano"
+
+    # Search and chunking defaults
+    top_k: int = 5
+    min_score: float = 0.35
+    max_chars_per_chunk: int = 1000
+    max_chunks_per_file: int = 100_000
+    supported_extensions: Tuple[str, ...] = (".txt", ".pdf")
+
+    # FastAPI app metadata and CORS
+    app_title: str = "AI Chat Bot API"
+    allowed_origins: Tuple[str, ...] = ("*",)
+
+    # JWT settings
+    jwt_secret: str = "change-this-secret"
+    jwt_algo: str = "HS256"
+    access_token_expire_minutes: int = 15
+    refresh_token_expire_days: int = 30
+
+    @classmethod
+    def from_env(cls, env: Mapping[str, str] = os.environ) -> "Settings":
+        """Build settings from a single snapshot of the environment."""
+        env = dict(env)
+        defaults = cls()
+        return cls(
+            db_driver=env.get("DB_DRIVER", defaults.db_driver).lower(),
+            db_host=env.get("DB_HOST", defaults.db_host),
+            db_port=int(env.get("DB_PORT", defaults.db_port)),
+            db_name=env.get("DB_NAME", defaults.db_name),
+            db_user=env.get("DB_USER", defaults.db_user),
+            db_password=env.get("DB_PASSWORD", defaults.db_password),
+            sqlite_path=env.get("SQLITE_PATH", defaults.sqlite_path),
+            db_pool_min=int(env.get("DB_POOL_MIN", defaults.db_pool_min)),
+            db_pool_max=int(env.get("DB_POOL_MAX", defaults.db_pool_max)),
+            db_pool_timeout=float(env.get("DB_POOL_TIMEOUT", defaults.db_pool_timeout)),
+            sqlite_pool_size=int(env.get("SQLITE_POOL_SIZE", defaults.sqlite_pool_size)),
+            qdrant_url=env.get("QDRANT_URL"),
+            qdrant_api_key=env.get("QDRANT_API_KEY"),
+            qdrant_collection_name=env.get("QDRANT_COLLECTION_NAME", defaults.qdrant_collection_name),
+            qdrant_path=env.get("QDRANT_PATH", defaults.qdrant_path),
+            qdrant_prefer_grpc=env.get("QDRANT_PREFER_GRPC", "").lower() in ("1", "true", "yes"),
+            qdrant_grpc_port=int(env.get("QDRANT_GRPC_PORT", defaults.qdrant_grpc_port)),
+            qdrant_timeout=int(env.get("QDRANT_TIMEOUT", defaults.qdrant_timeout)),
+            openai_api_key=env.get("OPENAI_API_KEY"),
+            embedding_model=env.get("EMBEDDING_MODEL", defaults.embedding_model),
+            chat_model=env.get("OPENAI_CHAT_MODEL", defaults.chat_model),
+            allowed_origins=_parse_origins(env.get("ALLOWED_ORIGINS")),
+            jwt_secret=env.get("JWT_SECRET", defaults.jwt_secret),
+            jwt_algo=env.get("JWT_ALGO", defaults.jwt_algo),
+            access_token_expire_minutes=int(
+                env.get("ACCESS_TOKEN_EXPIRE_MINUTES", defaults.access_token_expire_minutes)
+            ),
+            refresh_token_expire_days=int(
+                env.get("REFRESH_TOKEN_EXPIRE_DAYS", defaults.refresh_token_expire_days)
+            ),
+        )
+
 
-# JWT settings
-JWT_SECRET = os.getenv("JWT_SECRET", "change-this-secret")
-JWT_ALGO = os.getenv("JWT_ALGO", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
-REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+settings = Settings.from_env()
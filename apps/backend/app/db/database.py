@@ -2,45 +2,49 @@
 Connection helpers shared by FastAPI dependencies.
 Supports both Postgres (via psycopg2 pool) and SQLite (single-file, good for Spaces).
 """
+import queue
+import re
 import sqlite3
+import threading
+import weakref
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Generator, Optional
+from typing import Any, Dict, Generator, Optional
 
 from fastapi import HTTPException
 
-from app.config import (
-    DB_DRIVER,
-    DB_HOST,
-    DB_NAME,
-    DB_PASSWORD,
-    DB_PORT,
-    DB_USER,
-    SQLITE_PATH,
-)
+from app.config import settings
 from app.db.schema import ensure_tables
 
-try:
-    from psycopg2 import OperationalError
-    from psycopg2.pool import SimpleConnectionPool
-except Exception:  # pragma: no cover - psycopg2 may be absent in SQLite-only mode
-    OperationalError = Exception  # type: ignore
-    SimpleConnectionPool = None  # type: ignore
 
-
-IS_SQLITE = DB_DRIVER == "sqlite"
+IS_SQLITE = settings.db_driver == "sqlite"
 DB_PLACEHOLDER = "?" if IS_SQLITE else "%s"
 
-pool: Optional[SimpleConnectionPool] = None  # Postgres pool
-sqlite_db_path = Path(SQLITE_PATH)
+pool: Optional[Any] = None  # Postgres ThreadedConnectionPool (psycopg2 is imported lazily)
+# One slot per pooled connection: requests wait for a free one instead of
+# ThreadedConnectionPool raising PoolError when all are checked out.
+pool_slots: Optional[threading.BoundedSemaphore] = None
+sqlite_db_path = Path(settings.sqlite_path)
+sqlite_pool: Optional["queue.Queue[sqlite3.Connection]"] = None  # Reused SQLite connections
+
+# Postgres server-side prepared statements: name -> SQL with $1-style params
+PREPARED_STATEMENTS: Dict[str, str] = {}
+_prepared_conns: "weakref.WeakSet" = weakref.WeakSet()
 
 
 @contextmanager
-def db_cursor(conn):
+def db_cursor(conn, dict_rows: bool = False):
     """
     Context manager that works for both psycopg2 and sqlite3 cursors.
+    With dict_rows=True, rows support access by column name (dict(row) works).
     """
-    cur = conn.cursor()
+    if dict_rows and not IS_SQLITE:
+        from psycopg2.extras import RealDictCursor
+
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+    else:
+        # SQLite connections already use sqlite3.Row (see _connect_sqlite)
+        cur = conn.cursor()
     try:
         yield cur
     finally:
@@ -50,42 +54,92 @@ def db_cursor(conn):
             pass
 
 
+def prepared_query(name: str, sql: str, param_count: int) -> str:
+    """
+    Register a hot query and return the text to execute for the active driver.
+
+    `sql` uses $1..$n placeholders in order. On Postgres the statement is
+    PREPAREd once per pooled connection and called via EXECUTE, so the server
+    skips parse/plan on every call; SQLite already caches compiled statements.
+    """
+    if IS_SQLITE:
+        return re.sub(r"\$\d+", "?", sql)
+    PREPARED_STATEMENTS[name] = sql
+    args = ", ".join(["%s"] * param_count)
+    return f"EXECUTE {name} ({args});"
+
+
+def _ensure_prepared(conn) -> None:
+    """PREPARE registered statements the first time a pooled connection is handed out."""
+    if not PREPARED_STATEMENTS or conn in _prepared_conns:
+        return
+    with db_cursor(conn) as cur:
+        for name, sql in PREPARED_STATEMENTS.items():
+            cur.execute(f"PREPARE {name} AS {sql};")
+    conn.commit()
+    _prepared_conns.add(conn)
+
+
+def _connect_sqlite() -> sqlite3.Connection:
+    """Open a SQLite connection and apply per-connection pragmas once."""
+    conn = sqlite3.connect(sqlite_db_path, check_same_thread=False)
+    # Row objects index like tuples and also convert cleanly with dict(row)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON;")
+    # WAL lets readers keep going while a writer commits
+    conn.execute("PRAGMA journal_mode = WAL;")
+    conn.execute("PRAGMA synchronous = NORMAL;")
+    conn.execute("PRAGMA temp_store = MEMORY;")
+    conn.execute("PRAGMA mmap_size = 268435456;")
+    return conn
+
+
 def _init_sqlite() -> None:
     """
     Ensure SQLite database file exists and schema is created.
-    A new connection is opened per request (see get_db_conn).
+    Opens a small pool of long-lived connections reused across requests (see get_db_conn).
     """
+    global sqlite_pool
+    if sqlite_pool is not None:
+        return
     sqlite_db_path.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(sqlite_db_path, check_same_thread=False)
-    try:
-        conn.execute("PRAGMA foreign_keys = ON;")
-        ensure_tables(conn, dialect="sqlite")
-    finally:
-        conn.close()
+    conn = _connect_sqlite()
+    ensure_tables(conn, dialect="sqlite")
+
+    sqlite_pool = queue.Queue(maxsize=max(1, settings.sqlite_pool_size))
+    sqlite_pool.put(conn)
+    for _ in range(sqlite_pool.maxsize - 1):
+        sqlite_pool.put(_connect_sqlite())
 
 
 def init_pool() -> None:
     """Bootstrap DB connectivity (pool for Postgres, file for SQLite)."""
-    global pool
+    global pool, pool_slots
     if IS_SQLITE:
         _init_sqlite()
         return
 
     if pool:
         return
-    if SimpleConnectionPool is None:
+    # Only Postgres deployments pay for importing psycopg2's C extension
+    try:
+        from psycopg2.pool import ThreadedConnectionPool
+    except ImportError:
         raise HTTPException(status_code=500, detail="psycopg2 not installed for Postgres mode")
 
-    pool = SimpleConnectionPool(
-        minconn=1,
-        maxconn=5,
-        host=DB_HOST,
-        port=DB_PORT,
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
+    # ThreadedConnectionPool opens `minconn` connections up front, so the
+    # first requests don't pay the connect + auth handshake.
+    pool = ThreadedConnectionPool(
+        minconn=settings.db_pool_min,
+        maxconn=max(settings.db_pool_min, settings.db_pool_max),
+        host=settings.db_host,
+        port=settings.db_port,
+        dbname=settings.db_name,
+        user=settings.db_user,
+        password=settings.db_password,
         connect_timeout=5,
     )
+    pool_slots = threading.BoundedSemaphore(pool.maxconn)
 
     # Quick ping + ensure base schema
     conn = pool.getconn()
@@ -100,8 +154,12 @@ def init_pool() -> None:
 
 def close_pool() -> None:
     """Close pooled connections when the app stops."""
-    global pool
+    global pool, sqlite_pool
     if IS_SQLITE:
+        if sqlite_pool is not None:
+            while not sqlite_pool.empty():
+                sqlite_pool.get_nowait().close()
+            sqlite_pool = None
         return
     if pool:
         pool.closeall()
@@ -111,23 +169,40 @@ def close_pool() -> None:
 def get_db_conn() -> Generator:
     """
     FastAPI dependency that hands out a connection.
-    For SQLite we open/close per request; for Postgres we borrow from the pool.
+    Both drivers borrow a long-lived connection and hand it back afterwards.
     """
     global pool
     if IS_SQLITE:
-        conn = sqlite3.connect(sqlite_db_path, check_same_thread=False)
-        conn.execute("PRAGMA foreign_keys = ON;")
+        if sqlite_pool is None:
+            raise HTTPException(status_code=500, detail="DB pool not initialized")
+        try:
+            conn = sqlite_pool.get(timeout=settings.db_pool_timeout)
+        except queue.Empty:
+            raise HTTPException(status_code=503, detail="No database connection available, please retry")
         try:
+            # Pragmas were applied once in _connect_sqlite; writers commit explicitly
             yield conn
-            conn.commit()
         finally:
-            conn.close()
+            # Never hand a half-finished transaction to the next request
+            if conn.in_transaction:
+                conn.rollback()
+            sqlite_pool.put(conn)
         return
 
-    if pool is None:
+    if pool is None or pool_slots is None:
         raise HTTPException(status_code=500, detail="DB pool not initialized")
-    conn = pool.getconn()
+    if not pool_slots.acquire(timeout=settings.db_pool_timeout):
+        raise HTTPException(status_code=503, detail="No database connection available, please retry")
     try:
-        yield conn
+        conn = pool.getconn()
+        if conn.closed:
+            # Dropped since it was last used (server restart, idle timeout): replace it
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+        try:
+            _ensure_prepared(conn)
+            yield conn
+        finally:
+            pool.putconn(conn, close=bool(conn.closed))
     finally:
-        pool.putconn(conn)
+        pool_slots.release()
@@ -0,0 +1,173 @@
+"""Small helpers for working with the `uploaded_files` / `file_chunks` tables."""
+from typing import List, Optional, Sequence
+
+from app.db.database import DB_PLACEHOLDER, IS_SQLITE, db_cursor
+
+# Driver-specific SQL text, built once at import
+INSERT_FILE_SQL = (
+    f"INSERT INTO uploaded_files (filename, content_type, size_bytes, chunk_count) "
+    f"VALUES ({DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER})"
+    + (";" if IS_SQLITE else " RETURNING id;")
+)
+INSERT_CHUNK_SQL = (
+    f"INSERT INTO file_chunks (file_id, chunk_index, content) "
+    f"VALUES ({DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER});"
+)
+INSERT_FILE_HASH_SQL = (
+    f"INSERT INTO file_hashes (content_hash, file_id) VALUES ({DB_PLACEHOLDER}, {DB_PLACEHOLDER}) "
+    "ON CONFLICT (content_hash) DO NOTHING;"
+)
+FILE_BY_HASH_SQL = f"SELECT file_id FROM file_hashes WHERE content_hash = {DB_PLACEHOLDER} LIMIT 1;"
+# Postgres only: data-modifying CTEs run exactly once, so the file row, its hash
+# mapping and every chunk (passed as two parallel arrays) land in one statement.
+STORE_FILE_WITH_CHUNKS_PG_SQL = """
+WITH f AS (
+    INSERT INTO uploaded_files (filename, content_type, size_bytes, chunk_count)
+    VALUES (%s, %s, %s, %s)
+    RETURNING id
+), h AS (
+    INSERT INTO file_hashes (content_hash, file_id)
+    SELECT hash.value, f.id FROM f, (SELECT %s::text AS value) AS hash
+    WHERE hash.value IS NOT NULL
+    ON CONFLICT (content_hash) DO NOTHING
+), c AS (
+    INSERT INTO file_chunks (file_id, chunk_index, content)
+    SELECT f.id, v.idx, v.content
+    FROM f, unnest(%s::int[], %s::text[]) AS v(idx, content)
+)
+SELECT id FROM f;
+"""
+DELETE_FILE_SQL = f"DELETE FROM uploaded_files WHERE id = {DB_PLACEHOLDER};"
+FILE_CHUNKS_SQL = f"SELECT content FROM file_chunks WHERE file_id = {DB_PLACEHOLDER} ORDER BY chunk_index;"
+
+
+def any_uploaded_files(conn) -> bool:
+    with db_cursor(conn) as cur:
+        cur.execute("SELECT 1 FROM uploaded_files LIMIT 1;")
+        return cur.fetchone() is not None
+
+
+def list_files_with_chunk_counts(conn) -> List[tuple]:
+    """Rows of (id, filename, content_type, size_bytes, created_at, chunk_count), newest first."""
+    # chunk_count is stored on the file row at upload time, so no join/aggregate
+    # over file_chunks; the created_at index serves the ordering.
+    with db_cursor(conn) as cur:
+        cur.execute(
+            """
+            SELECT id, filename, content_type, size_bytes, created_at, chunk_count
+            FROM uploaded_files
+            ORDER BY created_at DESC;
+            """
+        )
+        return cur.fetchall()
+
+
+def find_file_by_hash(conn, content_hash: str) -> Optional[int]:
+    """Id of the first file uploaded with these exact bytes, if any."""
+    with db_cursor(conn) as cur:
+        cur.execute(FILE_BY_HASH_SQL, (content_hash,))
+        row = cur.fetchone()
+        return row[0] if row else None
+
+
+def load_file_chunks(conn, file_id: int) -> List[str]:
+    """Chunk texts of a stored file, in chunk_index order."""
+    with db_cursor(conn) as cur:
+        cur.execute(FILE_CHUNKS_SQL, (file_id,))
+        return [row[0] for row in cur.fetchall()]
+
+
+def insert_uploaded_file(
+    conn, filename: str, content_type: str, size_bytes: int, chunk_count: int = 0
+) -> Optional[int]:
+    """Insert file metadata and return its id. Does not commit (see insert_file_chunks)."""
+    with db_cursor(conn) as cur:
+        cur.execute(INSERT_FILE_SQL, (filename, content_type, size_bytes, chunk_count))
+        if IS_SQLITE:
+            return cur.lastrowid
+        row = cur.fetchone()
+        return row[0] if row else None
+
+
+def store_file_with_chunks(
+    conn,
+    filename: str,
+    content_type: str,
+    size_bytes: int,
+    chunks: Sequence[str],
+    content_hash: Optional[str] = None,
+) -> Optional[int]:
+    """
+    Persist file metadata + chunks (and the content hash, if given) in one
+    transaction and return the file id.
+    Returns None (after rolling back) if the metadata row could not be created.
+    """
+    if not IS_SQLITE:
+        return _store_file_with_chunks_pg(conn, filename, content_type, size_bytes, chunks, content_hash)
+    try:
+        file_id = insert_uploaded_file(conn, filename, content_type, size_bytes, len(chunks))
+        if not file_id:
+            conn.rollback()
+            return None
+        insert_file_chunks(conn, file_id, chunks)
+        if content_hash:
+            # First upload of these bytes keeps the mapping
+            with db_cursor(conn) as cur:
+                cur.execute(INSERT_FILE_HASH_SQL, (content_hash, file_id))
+        conn.commit()
+        return file_id
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _store_file_with_chunks_pg(
+    conn,
+    filename: str,
+    content_type: str,
+    size_bytes: int,
+    chunks: Sequence[str],
+    content_hash: Optional[str],
+) -> Optional[int]:
+    """Postgres: file row, content hash and all chunks in one statement (one round trip)."""
+    params = (
+        filename,
+        content_type,
+        size_bytes,
+        len(chunks),
+        content_hash,
+        list(range(len(chunks))),
+        list(chunks),
+    )
+    try:
+        with db_cursor(conn) as cur:
+            cur.execute(STORE_FILE_WITH_CHUNKS_PG_SQL, params)
+            row = cur.fetchone()
+        if not row:
+            conn.rollback()
+            return None
+        conn.commit()
+        return row[0]
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def delete_uploaded_file(conn, file_id: int) -> None:
+    """Delete a file row; its chunks and content hash go with it (ON DELETE CASCADE)."""
+    with db_cursor(conn) as cur:
+        cur.execute(DELETE_FILE_SQL, (file_id,))
+    conn.commit()
+
+
+def insert_file_chunks(conn, file_id: int, chunks: Sequence[str]) -> None:
+    """
+    Insert all chunks for a file with one executemany (SQLite only; uploads on
+    Postgres go through STORE_FILE_WITH_CHUNKS_PG_SQL instead).
+    Does not commit: the caller owns the transaction (file metadata + chunks).
+    """
+    rows = [(file_id, idx, chunk) for idx, chunk in enumerate(chunks)]
+    if not rows:
+        return
+    with db_cursor(conn) as cur:
+        cur.executemany(INSERT_CHUNK_SQL, rows)
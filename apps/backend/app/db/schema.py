@@ -9,87 +9,112 @@ from pathlib import Path
 # Path to the shared SQL file (now kept alongside this module)
 SCHEMA_FILE = Path(__file__).resolve().parent / "table.sql"
 
-# Fallback SQL in case the file is missing at runtime (Postgres-flavored)
-FALLBACK_SQL = """
--- users table
-CREATE TABLE IF NOT EXISTS users (
+# Tables/indexes the schema SQL creates; used to skip DDL when they already exist
+SCHEMA_OBJECTS = (
+    "users",
+    "refresh_tokens",
+    "idx_refresh_tokens_user_id",
+    "idx_refresh_tokens_live",
+    "uploaded_files",
+    "idx_uploaded_files_created_at",
+    "file_chunks",
+    "idx_file_chunks_file_id",
+    "file_hashes",
+)
+
+# Set once the schema has been verified/created in this process
+_SCHEMA_READY = False
+
+# Built-in schema, one statement per entry. Joined once below so each dialect
+# still goes to the database as a single script.
+# Fallback in case table.sql is missing at runtime (Postgres-flavored).
+FALLBACK_STATEMENTS = (
+    """CREATE TABLE IF NOT EXISTS users (
     id BIGSERIAL PRIMARY KEY,
     email TEXT NOT NULL UNIQUE,
     password_hash TEXT NOT NULL,
     role TEXT NOT NULL DEFAULT 'user',
     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-);
-
--- refresh tokens
-CREATE TABLE IF NOT EXISTS refresh_tokens (
+);""",
+    """CREATE TABLE IF NOT EXISTS refresh_tokens (
     id BIGSERIAL PRIMARY KEY,
     user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
     token_hash TEXT NOT NULL UNIQUE,
     expires_at TIMESTAMPTZ NOT NULL,
     revoked BOOLEAN NOT NULL DEFAULT FALSE,
     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-);
-CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user_id ON refresh_tokens(user_id);
-
--- file metadata
-CREATE TABLE IF NOT EXISTS uploaded_files (
+);""",
+    "CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user_id ON refresh_tokens(user_id);",
+    # only live tokens are ever looked up, so keep that index small
+    "CREATE INDEX IF NOT EXISTS idx_refresh_tokens_live ON refresh_tokens(token_hash) WHERE revoked = FALSE;",
+    """CREATE TABLE IF NOT EXISTS uploaded_files (
     id              BIGSERIAL PRIMARY KEY,
     filename        TEXT NOT NULL,
     content_type    TEXT NOT NULL,
     size_bytes      BIGINT NOT NULL,
+    chunk_count     INTEGER NOT NULL DEFAULT 0,
     created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW()
-);
-
--- file chunks (what we embed)
-CREATE TABLE IF NOT EXISTS file_chunks (
+);""",
+    "CREATE INDEX IF NOT EXISTS idx_uploaded_files_created_at ON uploaded_files(created_at DESC);",
+    """CREATE TABLE IF NOT EXISTS file_chunks (
     id          BIGSERIAL PRIMARY KEY,
     file_id     BIGINT NOT NULL REFERENCES uploaded_files(id) ON DELETE CASCADE,
     chunk_index INT NOT NULL,
     content     TEXT NOT NULL
-);
-"""
-
-SQLITE_SQL = """
-CREATE TABLE IF NOT EXISTS users (
+);""",
+    "CREATE INDEX IF NOT EXISTS idx_file_chunks_file_id ON file_chunks(file_id, chunk_index);",
+    """CREATE TABLE IF NOT EXISTS file_hashes (
+    content_hash TEXT PRIMARY KEY,
+    file_id      BIGINT NOT NULL REFERENCES uploaded_files(id) ON DELETE CASCADE
+);""",
+)
+
+SQLITE_STATEMENTS = (
+    """CREATE TABLE IF NOT EXISTS users (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     email TEXT NOT NULL UNIQUE,
     password_hash TEXT NOT NULL,
     role TEXT NOT NULL DEFAULT 'user',
     created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
-);
-
-CREATE TABLE IF NOT EXISTS refresh_tokens (
+);""",
+    """CREATE TABLE IF NOT EXISTS refresh_tokens (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
     token_hash TEXT NOT NULL UNIQUE,
     expires_at TEXT NOT NULL,
     revoked BOOLEAN NOT NULL DEFAULT FALSE,
     created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
-);
-CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user_id ON refresh_tokens(user_id);
-
-CREATE TABLE IF NOT EXISTS uploaded_files (
+);""",
+    "CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user_id ON refresh_tokens(user_id);",
+    "CREATE INDEX IF NOT EXISTS idx_refresh_tokens_live ON refresh_tokens(token_hash) WHERE revoked = FALSE;",
+    """CREATE TABLE IF NOT EXISTS uploaded_files (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     filename TEXT NOT NULL,
     content_type TEXT NOT NULL,
     size_bytes INTEGER NOT NULL,
+    chunk_count INTEGER NOT NULL DEFAULT 0,
     created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
-);
-
-CREATE TABLE IF NOT EXISTS file_chunks (
+);""",
+    "CREATE INDEX IF NOT EXISTS idx_uploaded_files_created_at ON uploaded_files(created_at DESC);",
+    """CREATE TABLE IF NOT EXISTS file_chunks (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     file_id INTEGER NOT NULL REFERENCES uploaded_files(id) ON DELETE CASCADE,
     chunk_index INTEGER NOT NULL,
     content TEXT NOT NULL
-);
-"""
+);""",
+    "CREATE INDEX IF NOT EXISTS idx_file_chunks_file_id ON file_chunks(file_id, chunk_index);",
+    """CREATE TABLE IF NOT EXISTS file_hashes (
+    content_hash TEXT PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES uploaded_files(id) ON DELETE CASCADE
+);""",
+)
 
+FALLBACK_SQL = "\n\n".join(FALLBACK_STATEMENTS)
+SQLITE_SQL = "\n\n".join(SQLITE_STATEMENTS)
 
-def load_schema_sql(dialect: str) -> str:
-    """Load SQL text for the given dialect (postgres/sqlite)."""
-    if dialect == "sqlite":
-        return SQLITE_SQL
 
+def _read_schema_file() -> str:
+    """Read the Postgres schema from disk, falling back to the built-in SQL."""
     try:
         return SCHEMA_FILE.read_text(encoding="utf-8")
     except OSError:
@@ -97,26 +122,104 @@ def load_schema_sql(dialect: str) -> str:
         return FALLBACK_SQL
 
 
+# The file is invariant for the life of the process, so read it once at import
+POSTGRES_SQL = _read_schema_file()
+
+# Backfill role column if the DB was created before roles were added
+POSTGRES_ROLE_BACKFILL_SQL = """
+ALTER TABLE users ADD COLUMN IF NOT EXISTS role TEXT NOT NULL DEFAULT 'user';
+"""
+SQLITE_ROLE_BACKFILL_SQL = "ALTER TABLE users ADD COLUMN role TEXT NOT NULL DEFAULT 'user';"
+
+# Backfill uploaded_files.chunk_count (added so /files/history needn't join file_chunks)
+CHUNK_COUNT_FILL_SQL = """
+UPDATE uploaded_files
+SET chunk_count = (SELECT COUNT(*) FROM file_chunks c WHERE c.file_id = uploaded_files.id);
+"""
+POSTGRES_CHUNK_COUNT_BACKFILL_SQL = (
+    "ALTER TABLE uploaded_files ADD COLUMN IF NOT EXISTS chunk_count INTEGER NOT NULL DEFAULT 0;"
+    + CHUNK_COUNT_FILL_SQL
+)
+SQLITE_CHUNK_COUNT_BACKFILL_SQL = (
+    "ALTER TABLE uploaded_files ADD COLUMN chunk_count INTEGER NOT NULL DEFAULT 0;"
+    + CHUNK_COUNT_FILL_SQL
+)
+
+
+def load_schema_sql(dialect: str) -> str:
+    """Return SQL text for the given dialect (postgres/sqlite)."""
+    if dialect == "sqlite":
+        return SQLITE_SQL
+    return POSTGRES_SQL
+
+
+def _schema_objects_present(cur, dialect: str) -> bool:
+    """Cheap catalog probe: True when every table/index in SCHEMA_OBJECTS exists."""
+    if dialect == "sqlite":
+        cur.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'index');")
+        existing = {row[0] for row in cur.fetchall()}
+        return existing.issuperset(SCHEMA_OBJECTS)
+
+    cur.execute(
+        "SELECT COUNT(to_regclass(name)) FROM unnest(%s::text[]) AS name;",
+        (list(SCHEMA_OBJECTS),),
+    )
+    return cur.fetchone()[0] == len(SCHEMA_OBJECTS)
+
+
+def _has_column(cur, dialect: str, table: str, column: str) -> bool:
+    """True when table.column exists (for columns added after the first schema version)."""
+    if dialect == "sqlite":
+        cur.execute(f"PRAGMA table_info({table});")
+        return any(row[1] == column for row in cur.fetchall())
+
+    cur.execute(
+        """
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s AND column_name = %s
+        LIMIT 1;
+        """,
+        (table, column),
+    )
+    return cur.fetchone() is not None
+
+
 def ensure_tables(conn, dialect: str) -> None:
     """
     Execute the schema SQL against the provided connection.
-    Safe to run repeatedly thanks to IF NOT EXISTS in the statements.
+    Only the missing pieces run: a steady-state boot issues a few catalog
+    probes and no DDL (so no ALTER TABLE lock either).
     """
-    sql_text = load_schema_sql(dialect)
+    global _SCHEMA_READY
+    if _SCHEMA_READY:
+        return
+
     from app.db.database import db_cursor
 
+    sql_text = load_schema_sql(dialect)
     with db_cursor(conn) as cur:
-        if hasattr(cur, "executescript"):
-            cur.executescript(sql_text)
+        objects_ready = _schema_objects_present(cur, dialect)
+        role_ready = _has_column(cur, dialect, "users", "role")
+        chunk_count_ready = _has_column(cur, dialect, "uploaded_files", "chunk_count")
+
+        if dialect == "sqlite":
+            if not objects_ready:
+                cur.executescript(sql_text)
+            # Backfill role column if the DB was created before roles were added
+            if not role_ready and not _has_column(cur, dialect, "users", "role"):
+                cur.execute(SQLITE_ROLE_BACKFILL_SQL)
+            if not chunk_count_ready and not _has_column(cur, dialect, "uploaded_files", "chunk_count"):
+                cur.executescript(SQLITE_CHUNK_COUNT_BACKFILL_SQL)
         else:
-            cur.execute(sql_text)
-        # Backfill role column if the DB was created before roles were added
-        try:
-            if dialect == "sqlite":
-                cur.execute("ALTER TABLE users ADD COLUMN role TEXT NOT NULL DEFAULT 'user';")
-            else:
-                cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS role TEXT NOT NULL DEFAULT 'user';")
-        except Exception:
-            # Column already exists or SQLite lacks IF NOT EXISTS support in older versions.
-            pass
+            pending = []
+            if not objects_ready:
+                pending.append(sql_text)
+            if not role_ready:
+                pending.append(POSTGRES_ROLE_BACKFILL_SQL)
+            if not chunk_count_ready:
+                pending.append(POSTGRES_CHUNK_COUNT_BACKFILL_SQL)
+            if pending:
+                # Everything still missing in one round trip and one (implicit) transaction
+                cur.execute("".join(pending))
     conn.commit()
+    _SCHEMA_READY = True
@@ -17,6 +17,8 @@ CREATE TABLE IF NOT EXISTS refresh_tokens (
     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
 CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user_id ON refresh_tokens(user_id);
+-- only live tokens are ever looked up, so keep that index small
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_live ON refresh_tokens(token_hash) WHERE revoked = FALSE;
 
 -- file metadata
 CREATE TABLE IF NOT EXISTS uploaded_files (
@@ -24,8 +26,10 @@ CREATE TABLE IF NOT EXISTS uploaded_files (
     filename        TEXT NOT NULL,
     content_type    TEXT NOT NULL,
     size_bytes      BIGINT NOT NULL,
+    chunk_count     INTEGER NOT NULL DEFAULT 0,
     created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
+CREATE INDEX IF NOT EXISTS idx_uploaded_files_created_at ON uploaded_files(created_at DESC);
 
 -- file chunks (what we embed)
 CREATE TABLE IF NOT EXISTS file_chunks (
@@ -34,3 +38,11 @@ CREATE TABLE IF NOT EXISTS file_chunks (
     chunk_index INT NOT NULL,
     content     TEXT NOT NULL
 );
+-- chunk counts per file and ON DELETE CASCADE both look chunks up by file_id
+CREATE INDEX IF NOT EXISTS idx_file_chunks_file_id ON file_chunks(file_id, chunk_index);
+
+-- content hash -> first file uploaded with those bytes (re-uploads reuse its chunks/vectors)
+CREATE TABLE IF NOT EXISTS file_hashes (
+    content_hash TEXT PRIMARY KEY,
+    file_id      BIGINT NOT NULL REFERENCES uploaded_files(id) ON DELETE CASCADE
+);
@@ -2,9 +2,9 @@
 """Small helpers for working with the `users` table and refresh tokens."""
 import hashlib
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Union
 
-from app.db.database import DB_PLACEHOLDER, IS_SQLITE, db_cursor
+from app.db.database import DB_PLACEHOLDER, IS_SQLITE, db_cursor, prepared_query
 
 
 def _ph(count: int) -> str:
@@ -12,86 +12,106 @@ def _ph(count: int) -> str:
     return ", ".join([DB_PLACEHOLDER] * count)
 
 
-def email_exists(conn, email: str) -> bool:
+# Driver-specific SQL text, built once at import
+INSERT_USER_SQL = (
+    f"INSERT INTO users (email, password_hash, role) VALUES ({_ph(3)}) ON CONFLICT (email) DO NOTHING"
+    + (";" if IS_SQLITE else " RETURNING id;")
+)
+SAVE_REFRESH_TOKEN_SQL = f"""
+    INSERT INTO refresh_tokens (user_id, token_hash, expires_at)
+    VALUES ({_ph(3)})
+    ON CONFLICT (token_hash) DO NOTHING;
+"""
+UPDATE_PASSWORD_HASH_SQL = f"UPDATE users SET password_hash = {DB_PLACEHOLDER} WHERE id = {DB_PLACEHOLDER};"
+REVOKE_REFRESH_TOKEN_SQL = f"UPDATE refresh_tokens SET revoked = TRUE WHERE token_hash = {DB_PLACEHOLDER};"
+
+# Hot auth-path queries, prepared once per Postgres connection
+USER_BY_EMAIL_SQL = prepared_query(
+    "get_user_by_email",
+    # The caller already has the email, so it isn't echoed back
+    "SELECT id, password_hash, role FROM users WHERE email = $1 LIMIT 1",
+    1,
+)
+USER_BY_ID_SQL = prepared_query(
+    "get_user_by_id",
+    "SELECT id, email, password_hash, role FROM users WHERE id = $1 LIMIT 1",
+    1,
+)
+REFRESH_TOKEN_VALID_SQL = prepared_query(
+    "is_refresh_token_valid",
+    """
+    SELECT 1 FROM refresh_tokens
+    WHERE token_hash = $1 AND revoked = FALSE AND expires_at > CURRENT_TIMESTAMP
+    LIMIT 1
+    """,
+    1,
+)
+
+
+def insert_user_if_new(conn, email: str, password_hash: str, role: str = "user") -> Optional[int]:
+    """
+    Insert a user in one round trip, relying on the UNIQUE(email) constraint.
+    Returns the new id, or None when the email is already registered.
+    """
     with db_cursor(conn) as cur:
-        cur.execute(f"SELECT 1 FROM users WHERE email = {DB_PLACEHOLDER} LIMIT 1;", (email,))
-        return cur.fetchone() is not None
-
-
-def insert_user(conn, email: str, password_hash: str, role: str = "user") -> int:
-    with db_cursor(conn) as cur:
-        query = f"INSERT INTO users (email, password_hash, role) VALUES ({_ph(3)})"
-        if not IS_SQLITE:
-            query += " RETURNING id;"
+        cur.execute(INSERT_USER_SQL, (email, password_hash, role))
+        if IS_SQLITE:
+            user_id = cur.lastrowid if cur.rowcount == 1 else None
         else:
-            query += ";"
-        cur.execute(query, (email, password_hash, role))
-        user_id = cur.lastrowid if IS_SQLITE else cur.fetchone()[0]
+            row = cur.fetchone()
+            user_id = row[0] if row else None
     conn.commit()
     return user_id
 
 
 def get_user_by_email(conn, email: str) -> Optional[dict]:
-    with db_cursor(conn) as cur:
-        cur.execute(
-            f"SELECT id, email, password_hash, role FROM users WHERE email = {DB_PLACEHOLDER} LIMIT 1;",
-            (email,),
-        )
+    with db_cursor(conn, dict_rows=True) as cur:
+        cur.execute(USER_BY_EMAIL_SQL, (email,))
         row = cur.fetchone()
-        if not row:
-            return None
-        role = row[3] if len(row) > 3 else "user"
-        return {"id": row[0], "email": row[1], "password_hash": row[2], "role": role}
+        return dict(row) if row else None
 
 
 def get_user_by_id(conn, user_id: int) -> Optional[dict]:
-    with db_cursor(conn) as cur:
-        cur.execute(
-            f"SELECT id, email, password_hash, role FROM users WHERE id = {DB_PLACEHOLDER} LIMIT 1;",
-            (user_id,),
-        )
+    with db_cursor(conn, dict_rows=True) as cur:
+        cur.execute(USER_BY_ID_SQL, (user_id,))
         row = cur.fetchone()
-        if not row:
-            return None
-        role = row[3] if len(row) > 3 else "user"
-        return {"id": row[0], "email": row[1], "password_hash": row[2], "role": role}
+        return dict(row) if row else None
+
+
+def update_password_hash(conn, user_id: int, password_hash: str) -> None:
+    with db_cursor(conn) as cur:
+        cur.execute(UPDATE_PASSWORD_HASH_SQL, (password_hash, user_id))
+    conn.commit()
 
 
-def _hash_refresh_token(token: str) -> str:
-    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+def hash_refresh_token(token: Union[str, bytes]) -> str:
+    """SHA-256 hex digest of a refresh token; accepts already-encoded bytes as-is."""
+    if isinstance(token, str):
+        token = token.encode("utf-8")
+    return hashlib.sha256(token).digest().hex()
 
 
 def save_refresh_token(conn, user_id: int, token: str, expires_at: datetime) -> None:
-    token_hash = _hash_refresh_token(token)
-    expires_value = expires_at.strftime("%Y-%m-%d %H:%M:%S") if IS_SQLITE else expires_at
+    token_hash = hash_refresh_token(token)
+    # SQLite compares against CURRENT_TIMESTAMP text ("YYYY-MM-DD HH:MM:SS", UTC);
+    # isoformat on a naive datetime produces exactly that without strftime.
+    expires_value = expires_at.replace(tzinfo=None).isoformat(sep=" ", timespec="seconds") if IS_SQLITE else expires_at
     with db_cursor(conn) as cur:
-        cur.execute(
-            f"""
-            INSERT INTO refresh_tokens (user_id, token_hash, expires_at)
-            VALUES ({_ph(3)})
-            ON CONFLICT (token_hash) DO NOTHING;
-            """,
-            (user_id, token_hash, expires_value),
-        )
+        cur.execute(SAVE_REFRESH_TOKEN_SQL, (user_id, token_hash, expires_value))
     conn.commit()
 
 
-def revoke_refresh_token(conn, token: str) -> None:
-    token_hash = _hash_refresh_token(token)
+def revoke_refresh_token(conn, token: str, token_hash: Optional[str] = None) -> None:
+    """Revoke a refresh token; pass `token_hash` if the caller already computed it."""
+    token_hash = token_hash or hash_refresh_token(token)
     with db_cursor(conn) as cur:
-        cur.execute(f"UPDATE refresh_tokens SET revoked = TRUE WHERE token_hash = {DB_PLACEHOLDER};", (token_hash,))
+        cur.execute(REVOKE_REFRESH_TOKEN_SQL, (token_hash,))
     conn.commit()
 
 
-def is_refresh_token_valid(conn, token: str) -> bool:
-    token_hash = _hash_refresh_token(token)
+def is_refresh_token_valid(conn, token: str, token_hash: Optional[str] = None) -> bool:
+    """Check a refresh token is stored, live and unexpired; `token_hash` skips re-hashing."""
+    token_hash = token_hash or hash_refresh_token(token)
     with db_cursor(conn) as cur:
-        cur.execute(
-            f"""
-            SELECT 1 FROM refresh_tokens
-            WHERE token_hash = {DB_PLACEHOLDER} AND revoked = FALSE AND expires_at > CURRENT_TIMESTAMP
-            LIMIT 1;
-            """,
-            (token_hash,),
-        )
+        cur.execute(REFRESH_TOKEN_VALID_SQL, (token_hash,))
         return cur.fetchone() is not None
@@ -1,22 +1,29 @@
 """Application entrypoint that ties together routes, DB, and services."""
+import logging
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.config import ALLOWED_ORIGINS, APP_TITLE
+from app.config import settings
 from app.db.database import close_pool, init_pool
+from app.responses import FastJSONResponse
 from app.routes.auth_routes import router as auth_router
 from app.routes.chat_routes import router as chat_router
 from app.routes.file_routes import router as file_router
 from app.routes.health_routes import router as health_router
+from app.services.pdf_processing import shutdown_pdf_workers, start_pdf_workers
 from app.services.vector_store import ensure_qdrant_collection
 
-app = FastAPI(title=APP_TITLE)
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title=settings.app_title, default_response_class=FastJSONResponse)
 
 # Enable CORS for the Streamlit frontend
-allow_all = ALLOWED_ORIGINS == ["*"]
+allow_all = settings.allowed_origins == ("*",)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[] if allow_all else ALLOWED_ORIGINS,
+    allow_origins=[] if allow_all else list(settings.allowed_origins),
     allow_origin_regex=".*" if allow_all else None,
     allow_credentials=True,
     allow_methods=["*"],
@@ -29,14 +36,16 @@ def startup_event() -> None:
     """Create a small connection pool on startup and ensure schema exists."""
     init_pool()
     ensure_qdrant_collection()
-    print("DB pool initialized and Qdrant collection ensured.")
+    start_pdf_workers()
+    logger.info("DB pool initialized and Qdrant collection ensured.")
 
 
 @app.on_event("shutdown")
 def shutdown_event() -> None:
-    """Close the pool on shutdown."""
+    """Close the pool (and any PDF worker processes) on shutdown."""
     close_pool()
-    print("DB pool closed.")
+    shutdown_pdf_workers()
+    logger.info("DB pool closed.")
 
 # Register routers
 app.include_router(health_router)
@@ -1,8 +1,8 @@
 
 """Pydantic models used for request and response bodies."""
-from typing import Optional
+from typing import Annotated, Optional
 
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, StringConstraints, field_validator
 
 
 class RegisterRequest(BaseModel):
@@ -13,9 +13,21 @@ class RegisterRequest(BaseModel):
 
 
 class LoginRequest(BaseModel):
-    email: EmailStr
+    # Login only needs a plausibly-shaped address (the DB lookup is authoritative),
+    # so skip email_validator and use a pattern pydantic-core checks natively.
+    # Surrounding whitespace is stripped first, as EmailStr does.
+    email: Annotated[
+        str, StringConstraints(strip_whitespace=True, pattern=r"^[^@\s]+@[^@\s]+\.[^@\s]+$", max_length=254)
+    ]
     password: str
 
+    @field_validator("email")
+    @classmethod
+    def _normalize_domain(cls, value: str) -> str:
+        # Match EmailStr's normalization at registration (domain is lower-cased)
+        local, _, domain = value.rpartition("@")
+        return f"{local}@{domain.lower()}"
+
 
 class UserOut(BaseModel):
     id: int
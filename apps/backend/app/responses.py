@@ -0,0 +1,18 @@
+"""JSON response helpers shared by the app and the routes."""
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:  # orjson (Rust) encodes the string-heavy chat/upload payloads much faster than stdlib json
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:  # pragma: no cover - falls back to stdlib json
+    FastJSONResponse = JSONResponse
+
+
+def model_response(model: BaseModel, status_code: int = 200) -> JSONResponse:
+    """
+    Serialize an already-built response model directly.
+    Returning a Response makes FastAPI skip re-validating it against the
+    route's `response_model`, which stays on the route for the OpenAPI docs.
+    """
+    return FastJSONResponse(content=model.model_dump(mode="json"), status_code=status_code)
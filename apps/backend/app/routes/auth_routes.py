@@ -5,16 +5,17 @@ from datetime import datetime, timedelta, timezone
 import jwt
 from fastapi import APIRouter, Depends, HTTPException
 
-from app.config import REFRESH_TOKEN_EXPIRE_DAYS
+from app.config import settings
 from app.db.database import get_db_conn
 from app.db.user_repository import (
-    email_exists,
     get_user_by_email,
     get_user_by_id,
-    insert_user,
+    hash_refresh_token,
+    insert_user_if_new,
     is_refresh_token_valid,
     revoke_refresh_token,
     save_refresh_token,
+    update_password_hash,
 )
 from app.models.schemas import (
     AuthResponse,
@@ -24,25 +25,32 @@ from app.models.schemas import (
     TokenPair,
     UserOut,
 )
+from app.responses import model_response
 from app.services.security import (
-    create_access_token,
-    create_refresh_token,
+    create_token_pair,
     decode_token,
     hash_password,
+    password_needs_rehash,
     verify_password,
 )
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+# These endpoints are deliberately plain `def`: FastAPI runs them in its worker
+# threadpool, and both argon2 and hashlib.pbkdf2_hmac release the GIL, so concurrent logins
+# already hash in parallel across cores without blocking the event loop.
+#
+# Response models are built with `model_construct` (no validation): every field
+# comes from a validated request body, the DB, or our own token code.
+
 
 def _issue_tokens(db, user: dict) -> TokenPair:
     role = user.get("role", "user")
     user_id = user["id"]
-    access_token = create_access_token(user_id, role)
-    refresh_token = create_refresh_token(user_id, role)
-    expires_at = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    access_token, refresh_token = create_token_pair(user_id, role)
+    expires_at = datetime.now(timezone.utc) + timedelta(days=settings.refresh_token_expire_days)
     save_refresh_token(db, user_id, refresh_token, expires_at)
-    return TokenPair(access_token=access_token, refresh_token=refresh_token)
+    return TokenPair.model_construct(access_token=access_token, refresh_token=refresh_token)
 
 
 @router.post("/register", response_model=AuthResponse, status_code=201)
@@ -50,29 +58,27 @@ def register_user(payload: RegisterRequest, db=Depends(get_db_conn)):
     """
     Register a new user with email + password.
 
-    - Enforces unique email.
-    - Stores a PBKDF2 password hash (not the raw password).
+    - Enforces unique email (via the DB constraint, in a single INSERT).
+    - Stores an Argon2id password hash (not the raw password).
     - Returns the minimal user profile plus an access+refresh token pair.
     """
-    # Basic existence check to give a clean 409
-    if email_exists(db, payload.email):
-        raise HTTPException(status_code=409, detail="Email already registered")
-
     role = (payload.role or "user").lower()
     if role not in ("admin", "user"):
         raise HTTPException(status_code=400, detail="Invalid role")
 
     pwd_hash = hash_password(payload.password)
     try:
-        user_id = insert_user(db, payload.email, pwd_hash, role=role)
+        user_id = insert_user_if_new(db, payload.email, pwd_hash, role=role)
     except Exception as e:
         # Rollback on generic DB errors
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Registration failed: {e}")
+    if user_id is None:
+        raise HTTPException(status_code=409, detail="Email already registered")
 
     user = {"id": user_id, "email": payload.email, "role": role}
     tokens = _issue_tokens(db, user)
-    return AuthResponse(user=UserOut(**user), tokens=tokens)
+    return model_response(AuthResponse.model_construct(user=UserOut.model_construct(**user), tokens=tokens), status_code=201)
 
 
 @router.post("/login", response_model=AuthResponse)
@@ -80,7 +86,8 @@ def login_user(payload: LoginRequest, db=Depends(get_db_conn)):
     """
     Validate user credentials.
 
-    - Verifies email exists and password matches the stored PBKDF2 hash.
+    - Verifies email exists and password matches the stored hash.
+    - Upgrades legacy PBKDF2 hashes to Argon2id after a successful check.
     - Issues access and refresh tokens on success.
     """
     user = get_user_by_email(db, payload.email)
@@ -88,8 +95,16 @@ def login_user(payload: LoginRequest, db=Depends(get_db_conn)):
         # Avoid leaking which field failed
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
+    if password_needs_rehash(user["password_hash"]):
+        try:
+            update_password_hash(db, user["id"], hash_password(payload.password))
+        except Exception:
+            # Not fatal: the old hash still works, we'll retry on the next login
+            db.rollback()
+
     tokens = _issue_tokens(db, user)
-    return AuthResponse(user=UserOut(id=user["id"], email=user["email"], role=user.get("role", "user")), tokens=tokens)
+    user_out = UserOut.model_construct(id=user["id"], email=payload.email, role=user.get("role", "user"))
+    return model_response(AuthResponse.model_construct(user=user_out, tokens=tokens))
 
 
 @router.post("/refresh", response_model=TokenPair)
@@ -106,12 +121,14 @@ def refresh_tokens(payload: RefreshRequest, db=Depends(get_db_conn)):
     if user_id is None:
         raise HTTPException(status_code=401, detail="Invalid refresh token payload")
 
-    if not is_refresh_token_valid(db, payload.refresh_token):
+    # Hash once and reuse it for both the lookup and the revoke
+    token_hash = hash_refresh_token(payload.refresh_token)
+    if not is_refresh_token_valid(db, payload.refresh_token, token_hash=token_hash):
         raise HTTPException(status_code=401, detail="Refresh token revoked or not found")
 
     # Rotate: revoke the presented refresh token and issue a new pair
-    revoke_refresh_token(db, payload.refresh_token)
+    revoke_refresh_token(db, payload.refresh_token, token_hash=token_hash)
     user = get_user_by_id(db, int(user_id))
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
-    return _issue_tokens(db, user)
+    return model_response(_issue_tokens(db, user))
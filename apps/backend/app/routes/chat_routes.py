@@ -1,28 +1,74 @@
 """Routes that handle chat over uploaded documents."""
-from typing import List
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from qdrant_client.http import models as qmodels
 
-from app.config import CHAT_MODEL, MIN_SCORE, QDRANT_COLLECTION_NAME, TOP_K
+from app.config import settings
 from app.models.schemas import ChatRequest, ChatResponse
-from app.services.embeddings import embed_texts, openai_client
-from app.services.vector_store import qdrant_client
-from app.db.database import db_cursor, get_db_conn
+from app.responses import model_response
+from app.services import answer_cache
+from app.services.embeddings import async_openai_client, embed_texts
+from app.services.vector_store import get_qdrant_client
+from app.db.database import get_db_conn
+from app.db.file_repository import any_uploaded_files
 
 router = APIRouter(tags=["chat"])
 
+# Search the int8-quantized vectors, then rescore 2x top_k candidates with the
+# original vectors so quantization doesn't cost recall.
+SEARCH_PARAMS = qmodels.SearchParams(
+    quantization=qmodels.QuantizationSearchParams(rescore=True, oversampling=2.0),
+)
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(payload: ChatRequest, conn=Depends(get_db_conn)):
+# Static prompt pieces; only the context block and question vary per request
+SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "You are a helpful support assistant that only uses the given context.",
+}
+PROMPT_PREFIX = (
+    "You are an AI assistant that answers questions using ONLY the provided document context.\n"
+    "If the answer is not clearly contained in the context, say that you cannot find it "
+    "in the document. Do NOT invent facts.\n\n"
+    "Document context:\n"
+)
+PROMPT_QUESTION = "\n\nUser question: "
+PROMPT_SUFFIX = "\n\nAnswer:"
+
+
+@dataclass
+class _ChatTurn:
     """
-    Chat over a single uploaded file.
+    Everything the chat endpoints need after retrieval: either an immediate
+    `reply` (cache hit / no match) or the `messages` to send to the LLM.
+    """
+    file_id: Optional[int]
+    question: str
+    question_embedding: Optional[List[float]] = None
+    reply: Optional[str] = None
+    messages: Optional[List[dict]] = None
 
-    Flow:
+
+def _reply(text: str):
+    # Serialized directly: skips FastAPI re-validating the response model
+    return model_response(ChatResponse(reply=text))
+
+
+async def _prepare_turn(payload: ChatRequest, conn) -> _ChatTurn:
+    """
+    Steps 1-3 shared by /chat and /chat/stream:
       1. Embed the user question.
       2. Search Qdrant in the given file's chunks (filter by file_id).
-      3. If no relevant chunk found -> return a friendly "no match" message.
-      4. Otherwise, send top chunks + question to OpenAI and return the answer.
+      3. If no relevant chunk found -> a friendly "no match" reply;
+         otherwise build the prompt from the top chunks.
+
+    Embeddings use the async OpenAI client; the blocking Qdrant call goes
+    through run_in_threadpool to keep the event loop free.
     """
     question = payload.message.strip()
     file_id = payload.file_id
@@ -33,25 +79,29 @@ async def chat_endpoint(payload: ChatRequest, conn=Depends(get_db_conn)):
             detail="Question must not be empty.",
         )
 
-    # 1) Embed the question using the same embedding model as for documents
-    try:
-        question_embedding = embed_texts([question])[0]
-    except Exception as exc:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to embed question: {exc}",
-        )
+    # Same question against the same scope -> reuse the earlier answer
+    cached_answer = answer_cache.get_exact(file_id, question)
+    if cached_answer is not None:
+        return _ChatTurn(file_id, question, reply=cached_answer)
+
+    # 1) Embed the question using the same embedding model as for documents.
+    #    When no file is pinned, check that any file exists while the embedding runs.
+    embed_task = asyncio.ensure_future(embed_texts([question]))
 
     # Resolve file_id if not provided: default to searching across all uploaded files
     query_filter = None
     if file_id is None:
-        with db_cursor(conn) as cur:
-            cur.execute("SELECT 1 FROM uploaded_files LIMIT 1;")
-            if not cur.fetchone():
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="No uploaded files available yet. Please ask an admin to upload one.",
-                )
+        try:
+            has_files = await run_in_threadpool(any_uploaded_files, conn)
+        except BaseException:
+            embed_task.cancel()
+            raise
+        if not has_files:
+            embed_task.cancel()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No uploaded files available yet. Please ask an admin to upload one.",
+            )
     else:
         query_filter = qmodels.Filter(
             must=[
@@ -62,13 +112,32 @@ async def chat_endpoint(payload: ChatRequest, conn=Depends(get_db_conn)):
             ]
         )
 
+    try:
+        question_embedding = (await embed_task)[0]
+    except Exception as exc:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to embed question: {exc}",
+        )
+
+    # A near-identical question was answered already -> skip search + LLM
+    cached_answer = answer_cache.get_semantic(file_id, question_embedding)
+    if cached_answer is not None:
+        return _ChatTurn(file_id, question, question_embedding, reply=cached_answer)
+
     # 2) Search Qdrant for most similar chunks
     try:
-        response = qdrant_client.query_points(
-            collection_name=QDRANT_COLLECTION_NAME,
+        response = await run_in_threadpool(
+            get_qdrant_client().query_points,
+            collection_name=settings.qdrant_collection_name,
             query=question_embedding,
-            limit=TOP_K,
+            limit=settings.top_k,
             query_filter=query_filter,
+            search_params=SEARCH_PARAMS,
+            # Qdrant drops weak matches itself, so they are never sent back
+            score_threshold=settings.min_score,
+            # Only the fields the context block uses
+            with_payload=["text", "chunk_index"],
         )
         search_results = response.points
     except Exception as exc:
@@ -77,24 +146,17 @@ async def chat_endpoint(payload: ChatRequest, conn=Depends(get_db_conn)):
             detail=f"Vector search failed: {exc}",
         )
 
-    # No chunks at all
+    # Nothing scored above MIN_SCORE -> no relevant chunk, skip the LLM call
     if not search_results:
-        return ChatResponse(
-            reply=(
-                "I couldn't find any relevant information in the uploaded document "
-                "for your question."
-            )
-        )
-
-    # Check best score against threshold for relevance
-    best_score = search_results[0].score
-    if best_score is None or best_score < MIN_SCORE:
-        return ChatResponse(
+        return _ChatTurn(
+            file_id,
+            question,
+            question_embedding,
             reply=(
                 "I searched your uploaded document but couldn't find a strong match "
                 "for your question. Please try rephrasing or ask about another part "
                 "of the document."
-            )
+            ),
         )
 
     # 3) Build context from top-k chunks
@@ -107,43 +169,64 @@ async def chat_endpoint(payload: ChatRequest, conn=Depends(get_db_conn)):
             context_snippets.append(f"[Chunk {chunk_index}] {text}")
 
     if not context_snippets:
-        return ChatResponse(
+        return _ChatTurn(
+            file_id,
+            question,
+            question_embedding,
             reply=(
                 "I tried to read relevant parts of the document, but couldn't extract "
                 "any usable text for your question."
-            )
+            ),
         )
 
     context_block = "\n\n".join(context_snippets)
 
     # 4) Ask OpenAI to answer based ONLY on this context
     #    The instructions explicitly tell it not to hallucinate beyond context.
-    try:
-        prompt_for_model = (
-            "You are an AI assistant that answers questions using ONLY the provided document context.\n"
-            "If the answer is not clearly contained in the context, say that you cannot find it "
-            "in the document. Do NOT invent facts.\n\n"
-            f"Document context:\n{context_block}\n\n"
-            f"User question: {question}\n\n"
-            "Answer:"
+    prompt_for_model = "".join((PROMPT_PREFIX, context_block, PROMPT_QUESTION, question, PROMPT_SUFFIX))
+    messages = [
+        SYSTEM_MESSAGE,
+        {
+            "role": "user",
+            "content": prompt_for_model,
+        },
+    ]
+    return _ChatTurn(file_id, question, question_embedding, messages=messages)
+
+
+def _fallback_answer(answer: str, turn: _ChatTurn) -> str:
+    """Cache a real answer; swap an empty one for a friendly message."""
+    if not answer:
+        return (
+            "I tried to answer from the document, but couldn't generate a useful response. "
+            "Please try rephrasing your question."
         )
+    answer_cache.store(turn.file_id, turn.question, turn.question_embedding, answer)
+    return answer
+
 
-        completion = openai_client.chat.completions.create(
-            model=CHAT_MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful support assistant that only uses the given context.",
-                },
-                {
-                    "role": "user",
-                    "content": prompt_for_model,
-                },
-            ],
+@router.post("/chat", response_model=ChatResponse)
+async def chat_endpoint(payload: ChatRequest, conn=Depends(get_db_conn)):
+    """
+    Chat over a single uploaded file.
+
+    Flow:
+      1. Embed the user question.
+      2. Search Qdrant in the given file's chunks (filter by file_id).
+      3. If no relevant chunk found -> return a friendly "no match" message.
+      4. Otherwise, send top chunks + question to OpenAI and return the answer.
+    """
+    turn = await _prepare_turn(payload, conn)
+    if turn.reply is not None:
+        return _reply(turn.reply)
+
+    try:
+        completion = await async_openai_client.chat.completions.create(
+            model=settings.chat_model,
+            messages=turn.messages,
             temperature=0.2,
         )
-
-        answer = completion.choices[0].message.content.strip()
+        answer = (completion.choices[0].message.content or "").strip()
     except Exception as exc:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -151,10 +234,49 @@ async def chat_endpoint(payload: ChatRequest, conn=Depends(get_db_conn)):
         )
 
     # 5) Return the final answer to Streamlit
-    if not answer:
-        answer = (
-            "I tried to answer from the document, but couldn't generate a useful response. "
-            "Please try rephrasing your question."
-        )
+    return _reply(_fallback_answer(answer, turn))
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(payload: ChatRequest, conn=Depends(get_db_conn, scope="function")):
+    """
+    Same as /chat, but streams the answer as Server-Sent Events so the client
+    can render tokens as they arrive:
+        event: delta   data: {"text": "..."}   (repeated)
+        event: done    data: {"reply": "... full answer ..."}
+        event: error   data: {"detail": "..."} (if the LLM call fails mid-stream)
+    Validation and retrieval errors are still plain HTTP errors.
+    """
+    # scope="function": the DB connection goes back to the pool once this
+    # returns, instead of being held for the whole LLM stream
+    turn = await _prepare_turn(payload, conn)
+
+    async def events():
+        if turn.reply is not None:
+            yield _sse("done", {"reply": turn.reply})
+            return
+        parts: List[str] = []
+        try:
+            stream = await async_openai_client.chat.completions.create(
+                model=settings.chat_model,
+                messages=turn.messages,
+                temperature=0.2,
+                stream=True,
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield _sse("delta", {"text": delta})
+        except Exception as exc:
+            yield _sse("error", {"detail": f"LLM call failed: {exc}"})
+            return
+        yield _sse("done", {"reply": _fallback_answer("".join(parts).strip(), turn)})
 
-    return ChatResponse(reply=answer)
+    return StreamingResponse(events(), media_type="text/event-stream")
@@ -1,23 +1,78 @@
 """Routes for uploading and chunking documents."""
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
-from fastapi.responses import JSONResponse
-from qdrant_client.http import models as qmodels
+import asyncio
+import hashlib
+import logging
+import os
+from typing import List, Optional, Tuple
 
-from app.config import (
-    MAX_CHUNKS_PER_FILE,
-    SUPPORTED_EXTENSIONS,
-    QDRANT_COLLECTION_NAME,
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.db.database import get_db_conn
+from app.db.file_repository import (
+    delete_uploaded_file,
+    find_file_by_hash,
+    list_files_with_chunk_counts,
+    load_file_chunks,
+    store_file_with_chunks,
 )
-from app.db.database import DB_PLACEHOLDER, IS_SQLITE, db_cursor, get_db_conn
+from app.responses import FastJSONResponse
+from app.services import answer_cache
 from app.services.chunking import chunk_text
 from app.services.embeddings import embed_texts
-from app.services.pdf_processing import extract_text_from_pdf
-from app.services.vector_store import qdrant_client
+from app.services.pdf_processing import extract_chunks_from_pdf
+from app.services.vector_store import delete_file_points, fetch_file_vectors, upsert_file_chunks
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/files", tags=["files"])
 
 
-@router.post("/upload")
+def _sha256_of_stream(stream) -> str:
+    """Hex SHA-256 of a seekable binary stream, read in 1 MB blocks; rewinds it after."""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for block in iter(lambda: stream.read(1 << 20), b""):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def _reuse_previous_upload(conn, content_hash: str) -> Tuple[Optional[List[str]], Optional[List[List[float]]]]:
+    """
+    Chunks + vectors of an earlier upload with identical bytes, or (None, None)
+    when there is none (or its vectors are not all in Qdrant yet).
+    """
+    source_file_id = find_file_by_hash(conn, content_hash)
+    if source_file_id is None:
+        return None, None
+    chunks = load_file_chunks(conn, source_file_id)
+    if not chunks:
+        return None, None
+    embeddings = fetch_file_vectors(source_file_id, len(chunks))
+    if embeddings is None:
+        return None, None
+    return chunks, embeddings
+
+
+async def _discard_upload(conn, file_id: int, vectors_sent: bool) -> None:
+    """
+    Undo a failed upload: its Qdrant points (if any were sent) and its file row.
+    Errors are logged, not raised, so they never replace the original failure.
+    """
+    if vectors_sent:
+        try:
+            await run_in_threadpool(delete_file_points, file_id)
+        except Exception:
+            logger.exception("Failed to delete Qdrant points of failed upload %s", file_id)
+    try:
+        await run_in_threadpool(delete_uploaded_file, conn, file_id)
+    except Exception:
+        logger.exception("Failed to delete file row of failed upload %s", file_id)
+
+
+@router.post("/upload", status_code=status.HTTP_201_CREATED)
 async def upload_file(
     file: UploadFile = File(...),
     conn=Depends(get_db_conn),
@@ -41,16 +96,19 @@ async def upload_file(
         )
 
     filename_lower = file.filename.lower()
-    if not filename_lower.endswith(SUPPORTED_EXTENSIONS):
+    if not filename_lower.endswith(settings.supported_extensions):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Only .txt and .pdf files are supported right now.",
         )
 
     try:
-        # 2) Read file content into memory
-        raw_bytes = await file.read()
-        size_bytes = len(raw_bytes)
+        # 2) The upload is already spooled to a temp file by the framework;
+        #    take its size from there instead of copying it into memory.
+        upload_stream = file.file
+        upload_stream.seek(0, os.SEEK_END)
+        size_bytes = upload_stream.tell()
+        upload_stream.seek(0)
 
         if size_bytes == 0:
             raise HTTPException(
@@ -58,106 +116,92 @@ async def upload_file(
                 detail="Uploaded file is empty.",
             )
 
-        # 3) Decode / extract text based on file type
-        if filename_lower.endswith(".txt"):
-            text_content = raw_bytes.decode("utf-8", errors="ignore").strip()
-        else:  # .pdf
-            text_content = extract_text_from_pdf(raw_bytes)
+        # 3) Same bytes uploaded before? Reuse its chunks + vectors and skip
+        #    extraction and embedding entirely.
+        content_hash = await run_in_threadpool(_sha256_of_stream, upload_stream)
+        chunks, embeddings = await run_in_threadpool(_reuse_previous_upload, conn, content_hash)
+
+        if chunks is None:
+            # 4) Decode / extract text based on file type, then chunk it.
+            #    PDFs are chunked page by page inside the worker thread.
+            if filename_lower.endswith(".txt"):
+                raw_bytes = await file.read()
+                text_content = raw_bytes.decode("utf-8", errors="ignore").strip()
+                if not text_content:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="No readable text found in the uploaded file.",
+                    )
+                chunks = chunk_text(text_content)
+            else:  # .pdf
+                # Parsed from the spooled file inside the worker thread
+                chunks = await run_in_threadpool(extract_chunks_from_pdf, upload_stream)
+
+            if not chunks:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Uploaded file is empty or could not be parsed into chunks.",
+                )
+
+            # 5) Generate embeddings; the request runs while step 6 writes to the DB
+            embed_task = asyncio.ensure_future(embed_texts(chunks))
+        else:
+            embed_task = None
 
-        if not text_content:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="No readable text found in the uploaded file.",
+        # 6) Store file metadata + chunks in Postgres/SQLite.
+        #    The DB drivers are blocking, so run this off the event loop.
+        try:
+            file_id = await run_in_threadpool(
+                store_file_with_chunks,
+                conn,
+                file.filename,
+                file.content_type or "application/octet-stream",
+                size_bytes,
+                chunks,
+                content_hash,
             )
-
-        # 4) Chunk text
-        chunks = chunk_text(text_content)
-        if not chunks:
+        except Exception as db_exc:
+            if embed_task is not None:
+                embed_task.cancel()
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Uploaded file is empty or could not be parsed into chunks.",
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to store file or chunks: {db_exc}",
             )
-
-        # 5) Generate embeddings
-        embeddings = embed_texts(chunks)
-        if len(embeddings) != len(chunks):
+        if not file_id:
+            if embed_task is not None:
+                embed_task.cancel()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to generate embeddings for all chunks.",
+                detail="Failed to persist file metadata.",
             )
 
-        # 6) Store file metadata + chunks in Postgres/SQLite
-        try:
-            with db_cursor(conn) as cur:
-                # Insert file metadata
-                insert_meta_sql = f"""
-                    INSERT INTO uploaded_files (filename, content_type, size_bytes)
-                    VALUES ({DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER})
-                """
-                if not IS_SQLITE:
-                    insert_meta_sql += " RETURNING id;"
-                else:
-                    insert_meta_sql += ";"
-
-                cur.execute(
-                    insert_meta_sql,
-                    (
-                        file.filename,
-                        file.content_type or "application/octet-stream",
-                        size_bytes,
-                    ),
-                )
-                file_id = cur.lastrowid if IS_SQLITE else (cur.fetchone() or [None])[0]
-                if not file_id:
+        if embed_task is not None:
+            try:
+                embeddings = await embed_task
+                if len(embeddings) != len(chunks):
                     raise HTTPException(
                         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        detail="Failed to persist file metadata.",
+                        detail="Failed to generate embeddings for all chunks.",
                     )
-
-                # Insert chunks; if you need chunk_ids, collect them here
-                insert_chunk_sql = f"""
-                    INSERT INTO file_chunks (file_id, chunk_index, content)
-                    VALUES ({DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER});
-                """
-                for idx, chunk in enumerate(chunks):
-                    cur.execute(
-                        insert_chunk_sql,
-                        (file_id, idx, chunk),
-                    )
-            conn.commit()
-        except HTTPException:
-            raise
-        except Exception as db_exc:
-            conn.rollback()
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Failed to store file or chunks: {db_exc}",
-            )
+            except BaseException:
+                # Don't leave a file in history that has no vectors behind it
+                await _discard_upload(conn, file_id, vectors_sent=False)
+                raise
 
         # 7) Store embeddings in Qdrant
-        points = []
-        for idx, (chunk_text_value, vector) in enumerate(zip(chunks, embeddings)):
-            point_id = file_id * MAX_CHUNKS_PER_FILE + idx
-            points.append(
-                qmodels.PointStruct(
-                    id=point_id,
-                    vector=vector,
-                    payload={
-                        "file_id": file_id,
-                        "chunk_index": idx,
-                        "filename": file.filename,
-                        "text": chunk_text_value,
-                    },
-                )
-            )
+        try:
+            await run_in_threadpool(upsert_file_chunks, file_id, file.filename, chunks, embeddings)
+        except BaseException:
+            # Earlier batches may already be in Qdrant, where "all documents"
+            # search would still find them; remove those along with the row.
+            await _discard_upload(conn, file_id, vectors_sent=True)
+            raise
 
-        qdrant_client.upsert(
-            collection_name=QDRANT_COLLECTION_NAME,
-            points=points,
-        )
+        # Answers given across "all documents" may change with this file
+        answer_cache.invalidate_all_documents_scope()
 
         # 8) Success response
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=status.HTTP_201_CREATED,
             content={
                 "message": "File uploaded successfully",
@@ -170,8 +214,7 @@ async def upload_file(
         # Re-raise FastAPI-controlled errors
         raise
     except Exception as exc:
-        # Generic failure path
-        # TODO: Optionally delete partial DB rows / Qdrant points to keep things consistent.
+        # Generic failure path; steps 6-7 already removed any file row they wrote
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to upload file: {exc}",
@@ -185,23 +228,7 @@ async def list_uploaded_files(conn=Depends(get_db_conn)):
     Used by the Streamlit sidebar history to populate file pickers.
     """
     try:
-        with db_cursor(conn) as cur:
-            cur.execute(
-                """
-                SELECT
-                    f.id,
-                    f.filename,
-                    f.content_type,
-                    f.size_bytes,
-                    f.created_at,
-                    COUNT(c.id) AS chunk_count
-                FROM uploaded_files f
-                LEFT JOIN file_chunks c ON c.file_id = f.id
-                GROUP BY f.id
-                ORDER BY f.created_at DESC;
-                """
-            )
-            rows = cur.fetchall()
+        rows = await run_in_threadpool(list_files_with_chunk_counts, conn)
     except Exception as exc:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -223,4 +250,5 @@ async def list_uploaded_files(conn=Depends(get_db_conn)):
             }
         )
 
-    return {"files": files}
+    # Already plain JSON types: hand straight to the encoder, skipping jsonable_encoder
+    return FastJSONResponse(content={"files": files})
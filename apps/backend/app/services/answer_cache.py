@@ -0,0 +1,76 @@
+"""In-process cache for chat answers: exact question hits plus semantic near-matches."""
+import hashlib
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+EXACT_CACHE_MAX_ENTRIES = 2048
+SEMANTIC_CACHE_PER_FILE = 128
+# Answers older than this are recomputed even without an upload in between
+ANSWER_TTL_SECONDS = 600
+# OpenAI embeddings are unit-length, so a dot product is the cosine similarity
+SEMANTIC_MIN_SIMILARITY = 0.97
+
+# Cache scope is the file_id the question was asked against (None = all documents).
+# Entries carry their monotonic store time for the TTL check.
+_exact: "OrderedDict[Tuple[Optional[int], bytes], Tuple[str, float]]" = OrderedDict()
+_semantic: Dict[Optional[int], Deque[Tuple[np.ndarray, str, float]]] = {}
+
+
+def _question_key(question: str) -> bytes:
+    """16-byte digest of the normalized question (keys stay small for long questions)."""
+    normalized = " ".join(question.lower().split())
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+
+
+def _fresh(stored_at: float) -> bool:
+    return time.monotonic() - stored_at < ANSWER_TTL_SECONDS
+
+
+def get_exact(file_id: Optional[int], question: str) -> Optional[str]:
+    """Answer previously given for the same (file_id, question), if any."""
+    key = (file_id, _question_key(question))
+    entry = _exact.get(key)
+    if entry is None:
+        return None
+    if not _fresh(entry[1]):
+        del _exact[key]
+        return None
+    _exact.move_to_end(key)
+    return entry[0]
+
+
+def get_semantic(file_id: Optional[int], embedding: List[float]) -> Optional[str]:
+    """Answer for a previously seen question whose embedding is nearly identical."""
+    entries = _semantic.get(file_id)
+    while entries and not _fresh(entries[0][2]):
+        entries.popleft()  # oldest first, so expired entries sit at the left
+    if not entries:
+        return None
+    matrix = np.stack([entry[0] for entry in entries])
+    scores = matrix @ np.asarray(embedding, dtype=np.float32)
+    best = int(np.argmax(scores))
+    if scores[best] >= SEMANTIC_MIN_SIMILARITY:
+        return entries[best][1]
+    return None
+
+
+def store(file_id: Optional[int], question: str, embedding: List[float], answer: str) -> None:
+    now = time.monotonic()
+    key = (file_id, _question_key(question))
+    _exact[key] = (answer, now)
+    _exact.move_to_end(key)
+    while len(_exact) > EXACT_CACHE_MAX_ENTRIES:
+        _exact.popitem(last=False)
+
+    entries = _semantic.setdefault(file_id, deque(maxlen=SEMANTIC_CACHE_PER_FILE))
+    entries.append((np.asarray(embedding, dtype=np.float32), answer, now))
+
+
+def invalidate_all_documents_scope() -> None:
+    """Drop answers given across all documents; a new upload may change them."""
+    for key in [key for key in _exact if key[0] is None]:
+        del _exact[key]
+    _semantic.pop(None, None)
@@ -1,10 +1,10 @@
 """Tiny helper for breaking text into smaller pieces."""
 from typing import List
 
-from app.config import MAX_CHARS_PER_CHUNK
+from app.config import settings
 
 
-def chunk_text(text: str, max_chars: int = MAX_CHARS_PER_CHUNK) -> List[str]:
+def chunk_text(text: str, max_chars: int = settings.max_chars_per_chunk) -> List[str]:
     """
     Very simple character-based chunker.
     You can replace with token-based chunking later.
@@ -15,14 +15,17 @@ def chunk_text(text: str, max_chars: int = MAX_CHARS_PER_CHUNK) -> List[str]:
 
     chunks: List[str] = []
     start = 0
-    while start < len(text):
-        end = min(start + max_chars, len(text))
+    text_len = len(text)
+    while start < text_len:
+        end = min(start + max_chars, text_len)
         # Try to break at a newline or space for nicer chunks
         break_pos = text.rfind("\n", start, end)
         if break_pos == -1:
             break_pos = text.rfind(" ", start, end)
         if break_pos == -1 or break_pos <= start:
             break_pos = end
-        chunks.append(text[start:break_pos].strip())
+        chunk = text[start:break_pos].strip()
+        if chunk:
+            chunks.append(chunk)
         start = break_pos
-    return [c for c in chunks if c]
+    return chunks
@@ -1,27 +1,47 @@
 """Wrapper around the OpenAI client for embedding text."""
+import asyncio
 from typing import List
 
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
-from app.config import EMBEDDING_MODEL, OPENAI_API_KEY
+from app.config import settings
 
-# Single shared client instance
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+# Single shared async client (embeddings and chat completions). HTTP/2 multiplexes
+# concurrent requests over a few kept-alive TLS connections (h2 is already pinned).
+async_openai_client = AsyncOpenAI(
+    api_key=settings.openai_api_key,
+    http_client=DefaultAsyncHttpxClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    ),
+)
 
+# Inputs per embeddings request, and how many requests may be in flight at once
+EMBED_BATCH_SIZE = 256
+EMBED_MAX_CONCURRENCY = 4
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
+
+async def embed_texts(texts: List[str]) -> List[List[float]]:
     """
     Calls OpenAI embeddings for a list of texts.
-    Returns a list of embedding vectors.
+    Large inputs are split into batches that are sent concurrently.
+    Returns a list of embedding vectors in input order.
     """
     if not texts:
         return []
 
-    response = openai_client.embeddings.create(
-        model=EMBEDDING_MODEL,
-        input=texts,
-    )
+    semaphore = asyncio.Semaphore(EMBED_MAX_CONCURRENCY)
+
+    async def _embed_batch(batch: List[str]) -> List[List[float]]:
+        async with semaphore:
+            response = await async_openai_client.embeddings.create(
+                model=settings.embedding_model,
+                input=batch,
+            )
+        # Map back to list of floats
+        return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
 
-    # Map back to list of floats
-    vectors: List[List[float]] = [d.embedding for d in response.data]
-    return vectors
+    batches = [texts[i : i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+    results = await asyncio.gather(*(_embed_batch(batch) for batch in batches))
+    return [vector for batch_vectors in results for vector in batch_vectors]
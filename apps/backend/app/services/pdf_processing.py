@@ -1,46 +1,209 @@
 """Utility for extracting text from PDF uploads."""
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
+from typing import BinaryIO, Iterator, List, Optional, Sequence, Tuple, Union
 
 from fastapi import HTTPException, status
-from pypdf import PdfReader
 import pdfplumber 
+import pypdfium2 as pdfium
 
+from app.services.chunking import chunk_text
 
-def extract_text_from_pdf(pdf_bytes: bytes) -> str:
+
+# PDFium is not thread-safe and uploads are parsed in the threadpool,
+# so every call into it is serialized through this lock.
+_PDFIUM_LOCK = threading.Lock()
+
+
+# Large PDFs are split into page ranges parsed in worker processes, each with
+# its own PDFium (the in-process one is serialized by the lock above).
+PARALLEL_MIN_PAGES = 32
+PAGES_PER_TASK = 16
+PDF_WORKERS = min(8, os.cpu_count() or 1)
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # spawn: forking a threaded server process is not safe
+            _process_pool = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+
+def _worker_ready() -> None:
+    """No-op task; submitting it makes the pool spawn a worker."""
+
+
+def start_pdf_workers() -> None:
+    """
+    Spawn the worker processes in the background (called on app startup),
+    so the first large upload doesn't wait for them to boot.
+    """
+    if PDF_WORKERS > 1:
+        executor = _get_process_pool()
+        for _ in range(PDF_WORKERS):
+            executor.submit(_worker_ready)
+
+
+def _discard_process_pool(executor: ProcessPoolExecutor) -> None:
+    """Drop a broken pool (e.g. a worker was killed); the next call builds a new one."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is executor:
+            _process_pool = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pdf_workers() -> None:
+    """Stop the worker processes (called on app shutdown)."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(cancel_futures=True)
+            _process_pool = None
+
+
+def _pdfium_range_texts(pdf_path: str, start: int, stop: int) -> List[str]:
+    """Worker-process task: texts of pages [start, stop)."""
+    document = pdfium.PdfDocument(pdf_path)
+    try:
+        texts = []
+        for index in range(start, stop):
+            page = document[index]
+            textpage = page.get_textpage()
+            texts.append(textpage.get_text_range())
+            textpage.close()
+            page.close()
+        return texts
+    finally:
+        document.close()
+
+
+def _iter_range_texts(pdf_path: str, ranges: Sequence[Tuple[int, int]]) -> Iterator[str]:
     """
-    Extract text from a PDF byte stream using pypdf.
-    Returns a single string with text from all pages.
+    Page texts of `ranges` from the worker pool, in page order. If the pool
+    breaks, it is replaced and the ranges not yet yielded are retried once.
     """
+    done = 0
+    retried = False
+    while done < len(ranges):
+        executor = _get_process_pool()
+        futures = []
+        try:
+            futures = [executor.submit(_pdfium_range_texts, pdf_path, start, stop) for start, stop in ranges[done:]]
+            for future in futures:
+                texts = future.result()
+                done += 1
+                yield from texts
+        except BrokenProcessPool:
+            _discard_process_pool(executor)
+            if retried:
+                raise
+            retried = True
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def _iter_pdfium_page_texts(pdf_stream: BinaryIO) -> Iterator[str]:
+    """Page texts via PDFium (C++), releasing the lock between pages."""
+    # PDFium needs readinto() on file objects, which SpooledTemporaryFile
+    # (the upload stream) lacks before Python 3.11, so hand it bytes.
+    pdf_bytes = pdf_stream.read()
+    with _PDFIUM_LOCK:
+        document = pdfium.PdfDocument(pdf_bytes)
+        page_count = len(document)
+
+    if PDF_WORKERS > 1 and page_count >= PARALLEL_MIN_PAGES:
+        with _PDFIUM_LOCK:
+            document.close()
+        ranges = [
+            (start, min(start + PAGES_PER_TASK, page_count))
+            for start in range(0, page_count, PAGES_PER_TASK)
+        ]
+        # Workers open the document from a temp file rather than each task
+        # being sent a pickled copy of the whole PDF.
+        fd, pdf_path = tempfile.mkstemp(suffix=".pdf")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(pdf_bytes)
+            del pdf_bytes
+            yield from _iter_range_texts(pdf_path, ranges)
+        finally:
+            os.unlink(pdf_path)
+        return
+
     try:
-        text_parts = []
-
-        # Primary: pdfplumber (handles table layout better)
-        with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
-            for page in pdf.pages:
-                txt = page.extract_text() or ""
-                tables = page.extract_tables() or []
-                for table in tables:
-                    rows = ["\t".join((cell or "").strip() for cell in row) for row in table]
-                    txt += "\n" + "\n".join(rows)
-                if txt.strip():
-                    text_parts.append(txt.strip())
-
-        # Secondary fallback: pypdf
-        if not text_parts:
-            with BytesIO(pdf_bytes) as pdf_stream:
-                reader = PdfReader(pdf_stream)
-                for page in reader.pages:
-                    txt = page.extract_text() or ""
-                    if txt.strip():
-                        text_parts.append(txt.strip())
-
-        full_text = "\n\n".join(text_parts).strip()
-        if not full_text:
+        for index in range(page_count):
+            with _PDFIUM_LOCK:
+                page = document[index]
+                textpage = page.get_textpage()
+                txt = textpage.get_text_range()
+                textpage.close()
+                page.close()
+            yield txt
+    finally:
+        with _PDFIUM_LOCK:
+            document.close()
+
+
+def _iter_pdfplumber_page_texts(pdf_stream: BinaryIO) -> Iterator[str]:
+    """Page texts via pdfplumber, with tables flattened to tab-separated rows."""
+    with pdfplumber.open(pdf_stream) as plumber_pdf:
+        for page in plumber_pdf.pages:
+            txt = page.extract_text() or ""
+            tables = page.extract_tables() or []
+            for table in tables:
+                rows = ["\t".join((cell or "").strip() for cell in row) for row in table]
+                txt += "\n" + "\n".join(rows)
+            yield txt
+
+
+def iter_pdf_page_texts(pdf: Union[bytes, BinaryIO]) -> Iterator[str]:
+    """
+    Yield the non-empty text of each PDF page, one page at a time.
+    Accepts raw bytes or a seekable binary file (e.g. the spooled upload).
+    Uses PDFium first and falls back to pdfplumber if that finds nothing
+    or fails before yielding any text.
+    """
+    pdf_stream = BytesIO(pdf) if isinstance(pdf, bytes) else pdf
+    try:
+        found_text = False
+
+        # Primary: PDFium (native, much faster than the pure-Python parsers)
+        # Secondary fallback: pdfplumber (slower, but reads some layouts PDFium misses)
+        for extractor in (_iter_pdfium_page_texts, _iter_pdfplumber_page_texts):
+            pdf_stream.seek(0)
+            try:
+                for txt in extractor(pdf_stream):
+                    txt = (txt or "").strip()
+                    if txt:
+                        found_text = True
+                        yield txt
+            except Exception:
+                # Pages already yielded can't be taken back; otherwise try the next parser
+                if found_text or extractor is _iter_pdfplumber_page_texts:
+                    raise
+                continue
+            if found_text:
+                break
+
+        if not found_text:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="No readable text found in the uploaded PDF (may be scanned).",
             )
-        return full_text
 
     except HTTPException:
         raise
@@ -49,3 +212,14 @@ def extract_text_from_pdf(pdf_bytes: bytes) -> str:
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Failed to extract text from PDF: {exc}",
         )
+
+
+def extract_chunks_from_pdf(pdf: Union[bytes, BinaryIO]) -> List[str]:
+    """
+    Chunk a PDF page by page, so the whole document is never held
+    as one concatenated string.
+    """
+    chunks: List[str] = []
+    for page_text in iter_pdf_page_texts(pdf):
+        chunks.extend(chunk_text(page_text))
+    return chunks
@@ -1,73 +1,96 @@
 
-"""Password hashing helpers (PBKDF2) and JWT token utilities."""
+"""Password hashing helpers (Argon2id, legacy PBKDF2) and JWT token utilities."""
 import hashlib
 import hmac
-import secrets
-from typing import Optional
+from typing import Optional, Tuple
 from datetime import datetime, timedelta, timezone
 
 import jwt
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 
-from app.config import (
-    ACCESS_TOKEN_EXPIRE_MINUTES,
-    JWT_ALGO,
-    JWT_SECRET,
-    REFRESH_TOKEN_EXPIRE_DAYS,
-)
+from app.config import settings
 
+try:  # Optional native PBKDF2 (precomputes HMAC pads); output is identical to hashlib's
+    from fastpbkdf2 import pbkdf2_hmac as _pbkdf2_hmac
+except ImportError:  # pragma: no cover - falls back to OpenSSL via hashlib
+    _pbkdf2_hmac = hashlib.pbkdf2_hmac
+
+# New hashes use Argon2id (memory-hard); records start with "$argon2id$".
+ARGON2_PREFIX = "$argon2"
+_argon2 = PasswordHasher(time_cost=2, memory_cost=65536, parallelism=2)
+
+# Legacy PBKDF2 records ("pbkdf2_sha256$iters$salt$hash") still verify and are
+# upgraded to Argon2id on the next successful login.
 PBKDF2_ALGO = "pbkdf2_sha256"
-PBKDF2_ITERS = 150_000  # reasonable default, adjust per environment/hardware
-SALT_BYTES = 16
 
 
 def hash_password(password: str) -> str:
-    """Derive a PBKDF2-HMAC-SHA256 hash for the password with a random salt."""
+    """Derive an Argon2id hash for the password (salt is generated by argon2)."""
     if not isinstance(password, str) or password == "":
         raise ValueError("Password required")
-    salt = secrets.token_bytes(SALT_BYTES)
-    dk = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, PBKDF2_ITERS)
-    return f"{PBKDF2_ALGO}${PBKDF2_ITERS}${salt.hex()}${dk.hex()}"
+    return _argon2.hash(password)
 
 
-def verify_password(password: str, stored: str) -> bool:
-    """Verify a password against a stored PBKDF2 record."""
+def _verify_pbkdf2(password: str, stored: str) -> bool:
+    """Verify a password against a legacy PBKDF2 record."""
     try:
         algo, iters_s, salt_hex, hash_hex = stored.split("$", 3)
         if algo != PBKDF2_ALGO:
             return False
         iters = int(iters_s)
         salt = bytes.fromhex(salt_hex)
-        expected = bytes.fromhex(hash_hex)
-        dk = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iters)
-        return hmac.compare_digest(dk, expected)
+        dk = _pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iters)
+        # Records were written with .hex(), so compare in that form directly
+        return hmac.compare_digest(dk.hex(), hash_hex)
     except Exception:
         return False
 
 
-def _build_token(sub: int, role: str, expires_delta: timedelta, token_type: str) -> str:
-    """Create a signed JWT with a subject, expiry, and token type."""
-    now = datetime.now(timezone.utc)
-    payload = {
-        "sub": sub,
-        "role": role,
-        "type": token_type,
-        "iat": int(now.timestamp()),
-        "exp": int((now + expires_delta).timestamp()),
-    }
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGO)
+def verify_password(password: str, stored: str) -> bool:
+    """Verify a password against a stored Argon2id or legacy PBKDF2 record."""
+    if stored.startswith(ARGON2_PREFIX):
+        try:
+            return _argon2.verify(stored, password)
+        except (VerificationError, InvalidHashError):
+            return False
+    return _verify_pbkdf2(password, stored)
 
 
-def create_access_token(user_id: int, role: str) -> str:
-    return _build_token(user_id, role, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES), "access")
+def password_needs_rehash(stored: str) -> bool:
+    """True for legacy PBKDF2 records or Argon2 hashes made with older parameters."""
+    if not stored.startswith(ARGON2_PREFIX):
+        return True
+    try:
+        return _argon2.check_needs_rehash(stored)
+    except InvalidHashError:
+        return True
 
 
-def create_refresh_token(user_id: int, role: str) -> str:
-    return _build_token(user_id, role, timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS), "refresh")
+def create_token_pair(user_id: int, role: str) -> Tuple[str, str]:
+    """Create a signed (access, refresh) JWT pair with a subject, expiry, and token type."""
+    now = datetime.now(timezone.utc)
+    common = {"sub": user_id, "role": role, "iat": int(now.timestamp())}
+    claims = (
+        {
+            **common,
+            "type": "access",
+            "exp": int((now + timedelta(minutes=settings.access_token_expire_minutes)).timestamp()),
+        },
+        {
+            **common,
+            "type": "refresh",
+            "exp": int((now + timedelta(days=settings.refresh_token_expire_days)).timestamp()),
+        },
+    )
+
+    access, refresh = (jwt.encode(c, settings.jwt_secret, algorithm=settings.jwt_algo) for c in claims)
+    return access, refresh
 
 
 def decode_token(token: str, expected_type: Optional[str] = None) -> dict:
     """Decode and optionally validate the token type. Raises PyJWT errors on failure."""
-    data = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGO])
+    data = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algo])
     if expected_type and data.get("type") != expected_type:
         raise jwt.InvalidTokenError("Incorrect token type")
     return data
@@ -1,16 +1,15 @@
 """Helpers for talking to Qdrant (vector search)."""
+import threading
 from pathlib import Path
+from typing import List, Optional, Sequence
 
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as qmodels
 
-from app.config import (
-    EMBEDDING_DIM,
-    QDRANT_API_KEY,
-    QDRANT_COLLECTION_NAME,
-    QDRANT_PATH,
-    QDRANT_URL,
-)
+from app.config import settings
+
+# Ping idle gRPC channels so they aren't dropped between chat requests.
+GRPC_OPTIONS = {"grpc.keepalive_time_ms": 30_000}
 
 
 def _build_client() -> QdrantClient:
@@ -18,31 +17,130 @@ def _build_client() -> QdrantClient:
     Use remote Qdrant if QDRANT_URL is set; otherwise fall back to embedded mode
     (stores data under QDRANT_PATH).
     """
-    if QDRANT_URL:
-        return QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
-    Path(QDRANT_PATH).mkdir(parents=True, exist_ok=True)
-    return QdrantClient(path=QDRANT_PATH)
+    if settings.qdrant_url:
+        # gRPC keeps one persistent channel and sends vectors as protobuf
+        # instead of JSON float arrays; needs the server's gRPC port reachable.
+        return QdrantClient(
+            url=settings.qdrant_url,
+            api_key=settings.qdrant_api_key,
+            prefer_grpc=settings.qdrant_prefer_grpc,
+            grpc_port=settings.qdrant_grpc_port,
+            grpc_options=GRPC_OPTIONS if settings.qdrant_prefer_grpc else None,
+            timeout=settings.qdrant_timeout,
+        )
+    Path(settings.qdrant_path).mkdir(parents=True, exist_ok=True)
+    return QdrantClient(path=settings.qdrant_path)
+
 
+# Shared Qdrant client, built on first use so importing this module doesn't
+# open the embedded store (or a network channel) as a side effect.
+_client: Optional[QdrantClient] = None
+_client_lock = threading.Lock()
 
-# Shared Qdrant client instance
-qdrant_client = _build_client()
+
+def get_qdrant_client() -> QdrantClient:
+    """Return the shared Qdrant client, creating it on first call."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _build_client()
+    return _client
 
 
 def ensure_qdrant_collection() -> None:
     """
-    Creates the collection in Qdrant if it does not exist.
+    Creates the collection in Qdrant if it does not exist, plus the file_id payload index.
     Uses cosine distance and fixed vector size.
     """
-    try:
-        qdrant_client.get_collection(QDRANT_COLLECTION_NAME)
-        # If no exception, collection already exists.
-        return
-    except Exception:
-        # Collection does not exist yet -> create
-        qdrant_client.create_collection(
-            collection_name=QDRANT_COLLECTION_NAME,
+    client = get_qdrant_client()
+    if not client.collection_exists(settings.qdrant_collection_name):
+        client.create_collection(
+            collection_name=settings.qdrant_collection_name,
             vectors_config=qmodels.VectorParams(
-                size=EMBEDDING_DIM,
+                size=settings.embedding_dim,
                 distance=qmodels.Distance.COSINE,
             ),
+            # int8 copies of the vectors kept in RAM: ~4x less memory per search;
+            # /chat rescores the candidates against the original float vectors.
+            quantization_config=qmodels.ScalarQuantization(
+                scalar=qmodels.ScalarQuantizationConfig(
+                    type=qmodels.ScalarType.INT8,
+                    # Clip the outer 1% so a few extreme values don't waste int8 range.
+                    quantile=0.99,
+                    always_ram=True,
+                ),
+            ),
+        )
+
+    # /chat filters on file_id; index it so Qdrant doesn't scan every point.
+    # Creating an existing index is a no-op, so older collections get it too.
+    client.create_payload_index(
+        collection_name=settings.qdrant_collection_name,
+        field_name="file_id",
+        field_schema=qmodels.PayloadSchemaType.INTEGER,
+    )
+
+
+def point_id(file_id: int, chunk_index: int) -> int:
+    """Deterministic Qdrant point id for a file's chunk."""
+    return file_id * settings.max_chunks_per_file + chunk_index
+
+
+def fetch_file_vectors(file_id: int, count: int) -> Optional[List[List[float]]]:
+    """
+    Stored vectors for a file's first `count` chunks, in chunk order.
+    Returns None if any point is missing (e.g. not indexed yet or deleted).
+    """
+    ids = [point_id(file_id, idx) for idx in range(count)]
+    records = get_qdrant_client().retrieve(
+        collection_name=settings.qdrant_collection_name,
+        ids=ids,
+        with_payload=False,
+        with_vectors=True,
+    )
+    vectors = {record.id: record.vector for record in records}
+    if len(vectors) != count:
+        return None
+    return [vectors[pid] for pid in ids]
+
+
+def delete_file_points(file_id: int) -> None:
+    """Delete every point stored for a file (e.g. after a partly failed upload)."""
+    get_qdrant_client().delete(
+        collection_name=settings.qdrant_collection_name,
+        points_selector=qmodels.FilterSelector(
+            filter=qmodels.Filter(
+                must=[qmodels.FieldCondition(key="file_id", match=qmodels.MatchValue(value=file_id))]
+            )
+        ),
+    )
+
+
+# Points per upsert request; keeps each request body small for large uploads
+UPSERT_BATCH_SIZE = 256
+
+
+def upsert_file_chunks(file_id: int, filename: str, chunks: Sequence[str], vectors: Sequence[List[float]]) -> None:
+    """
+    Write a file's chunk vectors in batches without waiting for Qdrant to index them.
+    Each batch is sent as column-wise ids/vectors/payloads (one Batch model, not a
+    PointStruct per chunk) and the call returns once Qdrant accepts it into its WAL,
+    so the upload response is not held up by indexing.
+    """
+    ids = [point_id(file_id, idx) for idx in range(len(chunks))]
+    payloads = [
+        {"file_id": file_id, "chunk_index": idx, "filename": filename, "text": text}
+        for idx, text in enumerate(chunks)
+    ]
+    for start in range(0, len(ids), UPSERT_BATCH_SIZE):
+        stop = start + UPSERT_BATCH_SIZE
+        get_qdrant_client().upsert(
+            collection_name=settings.qdrant_collection_name,
+            points=qmodels.Batch(
+                ids=ids[start:stop],
+                vectors=list(vectors[start:stop]),
+                payloads=payloads[start:stop],
+            ),
+            wait=False,
         )
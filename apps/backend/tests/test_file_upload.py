@@ -0,0 +1,79 @@
+"""Upload route tests that run without Postgres, Qdrant or OpenAI."""
+from tempfile import SpooledTemporaryFile
+
+import pytest
+import starlette.formparsers
+from fastapi.testclient import TestClient
+
+from app.db.database import get_db_conn
+from app.main import app
+from app.routes import file_routes
+
+
+class _SpooledFileWithoutReadinto(SpooledTemporaryFile):
+    """SpooledTemporaryFile as on Python 3.10, which has no readinto()."""
+
+    readinto = None
+
+
+@pytest.fixture
+def client(monkeypatch):
+    stored = {}
+
+    def fake_store(conn, filename, content_type, size_bytes, chunks, content_hash):
+        stored["chunks"] = chunks
+        return 1
+
+    async def fake_embed(chunks):
+        return [[0.0] for _ in chunks]
+
+    monkeypatch.setattr(file_routes, "_reuse_previous_upload", lambda conn, content_hash: (None, None))
+    monkeypatch.setattr(file_routes, "store_file_with_chunks", fake_store)
+    monkeypatch.setattr(file_routes, "embed_texts", fake_embed)
+    monkeypatch.setattr(file_routes, "upsert_file_chunks", lambda *args: None)
+    app.dependency_overrides[get_db_conn] = lambda: None
+    try:
+        yield TestClient(app), stored
+    finally:
+        app.dependency_overrides.pop(get_db_conn, None)
+
+
+@pytest.mark.parametrize("spooled_file", [SpooledTemporaryFile, _SpooledFileWithoutReadinto])
+def test_upload_pdf(client, monkeypatch, make_pdf, spooled_file):
+    monkeypatch.setattr(starlette.formparsers, "SpooledTemporaryFile", spooled_file)
+    test_client, stored = client
+
+    response = test_client.post(
+        "/files/upload",
+        files={"file": ("hello.pdf", make_pdf("Hello from the upload test"), "application/pdf")},
+    )
+
+    assert response.status_code == 201, response.text
+    assert response.json()["chunks_stored"] == len(stored["chunks"]) >= 1
+    assert "Hello from the upload test" in " ".join(stored["chunks"])
+
+
+def test_upload_removes_file_when_qdrant_upsert_fails(client, monkeypatch):
+    deleted = []
+
+    def failing_upsert(*args):
+        raise RuntimeError("qdrant unavailable")
+
+    def failing_point_delete(file_id):
+        deleted.append(("points", file_id))
+        raise RuntimeError("qdrant still unavailable")
+
+    monkeypatch.setattr(file_routes, "upsert_file_chunks", failing_upsert)
+    monkeypatch.setattr(file_routes, "delete_file_points", failing_point_delete)
+    monkeypatch.setattr(file_routes, "delete_uploaded_file", lambda conn, file_id: deleted.append(("row", file_id)))
+    test_client, _ = client
+
+    response = test_client.post(
+        "/files/upload",
+        files={"file": ("notes.txt", b"Some notes worth keeping.", "text/plain")},
+    )
+
+    # The cleanup failure is logged; the client still sees the upsert error
+    assert response.status_code == 500
+    assert "qdrant unavailable" in response.json()["detail"]
+    assert deleted == [("points", 1), ("row", 1)]
@@ -0,0 +1,36 @@
+"""PDF extraction tests for the multi-process PDFium path."""
+import os
+import signal
+import time
+
+import pytest
+
+from app.services import pdf_processing
+
+
+@pytest.fixture
+def worker_pool(monkeypatch):
+    monkeypatch.setattr(pdf_processing, "PDF_WORKERS", 2)
+    # Fail loudly instead of quietly falling back to the slow parser
+    monkeypatch.setattr(pdf_processing, "_iter_pdfplumber_page_texts", None)
+    try:
+        yield
+    finally:
+        pdf_processing.shutdown_pdf_workers()
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGKILL"), reason="needs SIGKILL")
+def test_large_pdf_survives_a_killed_worker(worker_pool, make_pdf):
+    page_texts = [f"Page number {i}" for i in range(pdf_processing.PARALLEL_MIN_PAGES + 8)]
+    pdf = make_pdf(*page_texts)
+    assert list(pdf_processing.iter_pdf_page_texts(pdf)) == page_texts
+
+    executor = pdf_processing._process_pool
+    os.kill(next(iter(executor._processes)), signal.SIGKILL)
+    deadline = time.monotonic() + 10
+    while not executor._broken and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert executor._broken
+
+    assert list(pdf_processing.iter_pdf_page_texts(pdf)) == page_texts
+    assert pdf_processing._process_pool is not executor
@@ -0,0 +1,17 @@
+"""Request model validation."""
+import pytest
+from pydantic import ValidationError
+
+from app.models.schemas import LoginRequest
+
+
+def test_login_email_is_stripped_and_domain_lowercased():
+    login = LoginRequest(email="  Jane.Doe@Example.COM ", password=" secret ")
+    assert login.email == "Jane.Doe@example.com"
+    assert login.password == " secret "
+
+
+@pytest.mark.parametrize("email", ["not-an-email", "jane doe@example.com", "jane@example"])
+def test_login_rejects_malformed_email(email):
+    with pytest.raises(ValidationError):
+        LoginRequest(email=email, password="secret")
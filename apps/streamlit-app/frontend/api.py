@@ -1,46 +1,114 @@
 """Tiny HTTP helpers for talking to the FastAPI backend."""
+import atexit
+import time
+
 import httpx
 
-from frontend.config import API_BASE
+from frontend.config import API_BASE, STREAM_FLUSH_INTERVAL_MS
+
+try:  # orjson (Rust) is several times faster than stdlib json for chat payloads
+    import orjson
+
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:  # pragma: no cover - falls back to stdlib json
+    import json
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+    _loads = json.loads
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# One pooled client per Streamlit process so reruns reuse keep-alive
+# connections to the backend instead of opening a fresh socket per call.
+_CLIENT = httpx.Client(
+    base_url=API_BASE,
+    timeout=30.0,
+    limits=httpx.Limits(max_keepalive_connections=16, max_connections=32),
+)
+atexit.register(_CLIENT.close)
+
+# Large PDFs take a while to send and longer to be parsed/embedded server-side,
+# but a backend that isn't accepting connections should still fail fast.
+UPLOAD_TIMEOUT = httpx.Timeout(connect=10.0, read=300.0, write=300.0, pool=10.0)
 
 
 def api_get(path: str):
     """
     Simple GET helper for list-style endpoints.
     """
-    url = f"{API_BASE}{path}"
-    with httpx.Client(timeout=30.0) as client:
-        r = client.get(url)
-        r.raise_for_status()
-        return r.json()
+    r = _CLIENT.get(path)
+    r.raise_for_status()
+    return _loads(r.content)
 
 
 def api_post(path: str, payload: dict):
     """
     Simple JSON POST helper for normal endpoints like /auth/login, /chat, etc.
     """
-    url = f"{API_BASE}{path}"
-    with httpx.Client(timeout=30.0) as client:
-        r = client.post(url, json=payload)
-        r.raise_for_status()
-        return r.json()
+    r = _CLIENT.post(path, content=_dumps(payload), headers=_JSON_HEADERS)
+    r.raise_for_status()
+    return _loads(r.content)
 
 
 def api_upload_file(path: str, file):
     """
     Multipart file upload helper for /files/upload.
     """
-    url = f"{API_BASE}{path}"
-
-    file_bytes = file.getvalue()
     file_name = file.name
     file_type = file.type or "application/octet-stream"
 
+    # Hand httpx the file object itself so the multipart body is streamed
+    # from the upload buffer rather than copied into a new bytes object.
+    file.seek(0)
     files = {
-        "file": (file_name, file_bytes, file_type)
+        "file": (file_name, file, file_type)
     }
 
-    with httpx.Client(timeout=120.0) as client:
-        r = client.post(url, files=files)
+    r = _CLIENT.post(path, files=files, timeout=UPLOAD_TIMEOUT)
+    r.raise_for_status()
+    return _loads(r.content)
+
+
+def api_stream_chat(path: str, payload: dict):
+    """
+    Stream a chat answer from the backend's SSE endpoint (e.g. /chat/stream),
+    yielding text pieces as they arrive. Suitable for st.write_stream.
+
+    Deltas are batched for STREAM_FLUSH_INTERVAL_MS so the UI redraws at a
+    steady rate instead of once per token.
+    """
+    flush_interval = STREAM_FLUSH_INTERVAL_MS / 1000
+    with _CLIENT.stream("POST", path, content=_dumps(payload), headers=_JSON_HEADERS) as r:
         r.raise_for_status()
-        return r.json()
+        event = None
+        streamed = ""
+        pending = []
+        last_flush = time.monotonic()
+        for line in r.iter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = _loads(line[len("data: "):])
+                if event == "delta":
+                    streamed += data["text"]
+                    pending.append(data["text"])
+                    now = time.monotonic()
+                    if now - last_flush >= flush_interval:
+                        yield "".join(pending)
+                        pending.clear()
+                        last_flush = now
+                elif event == "done":
+                    if pending:
+                        yield "".join(pending)
+                    # Cached answers and the "no answer" fallback arrive only here
+                    if not streamed.strip():
+                        yield data["reply"]
+                    return
+                elif event == "error":
+                    raise RuntimeError(data["detail"])
+        # Stream closed without "done" (backend restart, proxy cut): don't drop the tail
+        if pending:
+            yield "".join(pending)
@@ -3,3 +3,11 @@ import os
 
 # Backend FastAPI base URL
 API_BASE = os.getenv("API_BASE", "http://127.0.0.1:8000")
+
+# Optional Redis for the per-user conversation cache, so it survives restarts and
+# is shared between replicas. Without it the cache lives in the browser session.
+REDIS_URL = os.getenv("REDIS_URL")
+CONVERSATION_CACHE_TTL = int(os.getenv("CONVERSATION_CACHE_TTL", str(24 * 3600)))
+
+# Streamed chat text is batched for this long before being drawn (16 ms ~ 60 fps)
+STREAM_FLUSH_INTERVAL_MS = int(os.getenv("STREAM_FLUSH_INTERVAL_MS", "16"))
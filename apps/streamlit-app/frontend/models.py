@@ -1,11 +1,23 @@
-"""Pydantic models shared across the Streamlit app."""
-from pydantic import BaseModel, EmailStr
+"""Data models shared across the Streamlit app."""
+from dataclasses import dataclass
+from typing import Optional
 
 
-class ChatResponse(BaseModel):
-    reply: str
+@dataclass(slots=True)
+class Upload:
+    """One uploaded file as listed by /files/history."""
 
-
-class User(BaseModel):
     id: int
-    email: EmailStr
+    filename: Optional[str]
+    chunk_count: Optional[int] = None
+    size_bytes: Optional[int] = None
+
+    @classmethod
+    def from_api(cls, raw: dict) -> "Upload":
+        """Normalize a backend record once, accepting the older key names too."""
+        return cls(
+            id=raw.get("id") or raw.get("file_id"),
+            filename=raw.get("filename") or raw.get("file_name"),
+            chunk_count=raw.get("chunk_count"),
+            size_bytes=raw.get("size_bytes"),
+        )
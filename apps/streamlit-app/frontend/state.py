@@ -1,29 +1,54 @@
 """Helpers to manage Streamlit session state in one place."""
 import base64
-import copy
 import json
+import re
 from typing import Optional
 
 import streamlit as st
 
+from frontend.config import CONVERSATION_CACHE_TTL, REDIS_URL
+from frontend.models import Upload
+
+try:  # orjson (Rust) is faster for the per-rerun auth payload round-trip
+    import orjson
+
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:  # pragma: no cover - falls back to stdlib json
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+    _loads = json.loads
+
+try:  # Optional: only used when REDIS_URL is set
+    import redis
+except ImportError:  # pragma: no cover - conversation cache stays in session_state
+    redis = None
+
+_redis = redis.Redis.from_url(REDIS_URL) if redis is not None and REDIS_URL else None
+
 AUTH_QUERY_KEY = "auth"
+# Titles given by create_new_conversation, before the first prompt renames them
+_GENERIC_TITLE = re.compile(r"New chat|Chat \d+")
 
 
 def ensure_base_state():
     """Ensure the base auth-related keys are present."""
-    if "user" not in st.session_state:
-        st.session_state.user = None  # {"id": ..., "email": ...}
-    if "tokens" not in st.session_state:
-        st.session_state.tokens = None  # {"access_token": ..., "refresh_token": ...}
-    if "uploads" not in st.session_state:
-        st.session_state.uploads = []  # admin-only: [{"file_id": int, "file_name": str}]
-    if "upload_history_loaded" not in st.session_state:
-        st.session_state.upload_history_loaded = False
-    if "uploader_key" not in st.session_state:
-        st.session_state.uploader_key = 0  # used to reset the file_uploader widget
-    if "conversation_cache" not in st.session_state:
-        # Per-user in-memory cache so chat history survives logout/login within the same browser session.
-        st.session_state.conversation_cache = {}
+    ss = st.session_state
+    # Keys are never deleted, only reset, so the defaults are needed once per session
+    if ss.get("_base_bootstrapped"):
+        return
+    ss.setdefault("user", None)  # {"id": ..., "email": ...}
+    ss.setdefault("tokens", None)  # {"access_token": ..., "refresh_token": ...}
+    ss.setdefault("uploads", [])  # admin-only: List[Upload]
+    ss.setdefault("upload_history_loaded", False)
+    ss.setdefault("uploader_key", 0)  # used to reset the file_uploader widget
+    # Per-user in-memory cache so chat history survives logout/login within the same browser session.
+    ss.setdefault("conversation_cache", {})
+    # Backend user id from a real /auth/login or /auth/register response in this
+    # session; never set from the ?auth= query param, which anyone can forge.
+    ss.setdefault("verified_user_id", None)
+    ss._base_bootstrapped = True
 
 
 def ensure_conversation_state():
@@ -31,30 +56,29 @@ def ensure_conversation_state():
     Initialize conversation-related session state.
     In future, you can fetch history from a backend API here.
     """
-    if "conversations" not in st.session_state:
-        # List[dict]: each dict = one conversation
-        st.session_state.conversations = []
-
-    if "active_conv_id" not in st.session_state:
-        st.session_state.active_conv_id = None
-
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
-
-    if "file_id" not in st.session_state:
-        st.session_state.file_id = None
-
-    if "file_name" not in st.session_state:
-        st.session_state.file_name = None
+    ss = st.session_state
+    if not ss.get("_conv_bootstrapped"):
+        ss.setdefault("conversations", [])  # List[dict]: each dict = one conversation
+        ss.setdefault("active_conv_id", None)
+        ss.setdefault("messages", [])
+        ss.setdefault("file_id", None)
+        ss.setdefault("file_name", None)
+        if "conversations_by_id" not in ss or "next_conv_id" not in ss:
+            # id -> conversation dict (same objects as in `conversations`) and the next free id
+            _reindex_conversations()
+        ss._conv_bootstrapped = True
+
+    # Views read the role from here instead of digging into the user dict each time
+    ss.user_role = (ss.user or {}).get("role", "user")
 
     # Try to restore cached conversations for this user if present
-    if st.session_state.user and not st.session_state.conversations:
-        restored = restore_conversations_for_user(st.session_state.user["email"])
+    if ss.user and not ss.conversations:
+        restored = restore_conversations_for_user(ss.user["email"])
         if restored:
             return
 
     # If logged in and no conversation yet, create the first one
-    if st.session_state.user and st.session_state.active_conv_id is None:
+    if ss.user and ss.active_conv_id is None:
         create_new_conversation(initial=True)
 
 
@@ -63,9 +87,11 @@ def create_new_conversation(initial: bool = False):
     Create a new blank conversation in local state.
     Later, this can call an API to create a new chat.
     """
-    conversations = st.session_state.conversations
+    ss = st.session_state
+    conversations = ss.conversations
 
-    new_id = (max([c["id"] for c in conversations]) + 1) if conversations else 1
+    new_id = ss.next_conv_id
+    ss.next_conv_id = new_id + 1
 
     conv = {
         "id": new_id,
@@ -76,23 +102,27 @@ def create_new_conversation(initial: bool = False):
     }
 
     conversations.append(conv)
-    st.session_state.active_conv_id = new_id
+    ss.conversations_by_id[new_id] = conv
+    ss.active_conv_id = new_id
 
     # Keep references aligned
-    st.session_state.messages = conv["messages"]
-    st.session_state.file_id = conv["file_id"]
-    st.session_state.file_name = conv["file_name"]
+    ss.messages = conv["messages"]
+    ss.file_id = conv["file_id"]
+    ss.file_name = conv["file_name"]
+
+
+def _reindex_conversations():
+    """Rebuild the id -> conversation index (and next id) after replacing the list."""
+    ss = st.session_state
+    ss.conversations_by_id = {conv["id"]: conv for conv in ss.get("conversations", [])}
+    ss.next_conv_id = max(ss.conversations_by_id, default=0) + 1
 
 
 def get_active_conversation():
     """
     Return the currently active conversation dict or None.
     """
-    active_id = st.session_state.active_conv_id
-    for conv in st.session_state.conversations:
-        if conv["id"] == active_id:
-            return conv
-    return None
+    return st.session_state.conversations_by_id.get(st.session_state.active_conv_id)
 
 
 def load_conversation(conv_id: int):
@@ -100,27 +130,28 @@ def load_conversation(conv_id: int):
     Set a given conversation as active and sync its fields
     into the top-level session_state for easier access.
     """
-    for conv in st.session_state.conversations:
-        if conv["id"] == conv_id:
-            st.session_state.active_conv_id = conv_id
+    ss = st.session_state
+    conv = ss.conversations_by_id.get(conv_id)
+    if conv is None:
+        return
+    ss.active_conv_id = conv_id
 
-            # Ensure messages list is shared
-            st.session_state.messages = conv.get("messages", [])
-            conv["messages"] = st.session_state.messages
+    # Bind the conversation's own list so appends land in it directly
+    ss.messages = conv.setdefault("messages", [])
 
-            st.session_state.file_id = conv.get("file_id")
-            st.session_state.file_name = conv.get("file_name")
-            return
+    ss.file_id = conv.get("file_id")
+    ss.file_name = conv.get("file_name")
 
 
 def update_active_conversation_metadata():
     """
     After changing file_id/file_name, sync to the active conversation.
     """
+    ss = st.session_state
     conv = get_active_conversation()
-    if conv:
-        conv["file_id"] = st.session_state.file_id
-        conv["file_name"] = st.session_state.file_name
+    if conv and (conv["file_id"], conv["file_name"]) != (ss.file_id, ss.file_name):
+        conv["file_id"] = ss.file_id
+        conv["file_name"] = ss.file_name
 
 
 def maybe_update_conversation_title_from_prompt(prompt: str):
@@ -131,7 +162,7 @@ def maybe_update_conversation_title_from_prompt(prompt: str):
     if not conv:
         return
     title = conv.get("title") or ""
-    if title.startswith("New chat") or title.startswith("Chat "):
+    if _GENERIC_TITLE.fullmatch(title):
         trimmed = prompt.strip()
         if not trimmed:
             return
@@ -141,73 +172,150 @@ def maybe_update_conversation_title_from_prompt(prompt: str):
 
 def reset_conversation_state():
     """Clear chat-related state for a fresh start."""
-    st.session_state.conversations = []
-    st.session_state.active_conv_id = None
-    st.session_state.messages = []
-    st.session_state.file_id = None
-    st.session_state.file_name = None
+    st.session_state.update(
+        conversations=[],
+        conversations_by_id={},
+        next_conv_id=1,
+        active_conv_id=None,
+        messages=[],
+        file_id=None,
+        file_name=None,
+    )
+
+
+def _clone_conv(conv: dict) -> dict:
+    """
+    Copy a conversation without re-cloning its messages: they are
+    (role, content) tuples, so a fresh list sharing them is enough.
+    """
+    return {**conv, "messages": list(conv.get("messages", []))}
+
+
+def _redis_key(user_id: int) -> str:
+    return f"conv:{user_id}"
 
 
 def stash_conversations_for_user(email: str):
-    """Cache current conversations for a given user inside session_state."""
+    """
+    Cache current conversations for a given user inside session_state,
+    and in Redis when configured and the user logged in for real this session.
+    """
     if not email:
         return
-    st.session_state.conversation_cache[email] = {
-        "conversations": copy.deepcopy(st.session_state.get("conversations", [])),
+    cache = {
+        "conversations": [_clone_conv(c) for c in st.session_state.get("conversations", [])],
         "active_conv_id": st.session_state.get("active_conv_id"),
     }
+    st.session_state.conversation_cache[email] = cache
+    user_id = st.session_state.get("verified_user_id")
+    if _redis is not None and user_id is not None:
+        try:
+            _redis.setex(_redis_key(user_id), CONVERSATION_CACHE_TTL, _dumps(cache))
+        except Exception:
+            # Non-fatal: the session copy above still covers this browser session
+            pass
 
 
-def restore_conversations_for_user(email: str) -> bool:
-    """Restore cached conversations if available. Returns True on success."""
+def _load_cached_conversations(email: str, user_id: Optional[int] = None) -> Optional[dict]:
+    """
+    Session copy first, then Redis (e.g. after a restart or on another replica)
+    when a verified `user_id` is given.
+    """
+    cache = st.session_state.conversation_cache.get(email)
+    if cache or _redis is None or user_id is None:
+        return cache
+    try:
+        raw = _redis.get(_redis_key(user_id))
+    except Exception:
+        return None
+    if not raw:
+        return None
+    cache = _loads(raw)
+    # JSON turns the (role, content) tuples into lists
+    for conv in cache.get("conversations", []):
+        conv["messages"] = [tuple(m) for m in conv.get("messages", [])]
+    return cache
+
+
+def restore_conversations_for_user(email: str, user_id: Optional[int] = None) -> bool:
+    """
+    Restore cached conversations if available. Returns True on success.
+    Pass `user_id` only straight after a real login; it lets Redis be read.
+    """
+    ss = st.session_state
     if not email:
         return False
-    cache = st.session_state.conversation_cache.get(email)
+    cache = _load_cached_conversations(email, user_id)
     if not cache:
         return False
 
-    st.session_state.conversations = copy.deepcopy(cache.get("conversations", []))
-    st.session_state.active_conv_id = cache.get("active_conv_id")
+    ss.conversations = [_clone_conv(c) for c in cache.get("conversations", [])]
+    _reindex_conversations()
+    ss.active_conv_id = cache.get("active_conv_id")
 
     # Align top-level convenience fields with the active conversation
     active = get_active_conversation()
     if active:
-        st.session_state.messages = active.get("messages", [])
-        active["messages"] = st.session_state.messages  # keep shared reference
-        st.session_state.file_id = active.get("file_id")
-        st.session_state.file_name = active.get("file_name")
+        ss.messages = active.setdefault("messages", [])  # shared reference
+        ss.file_id = active.get("file_id")
+        ss.file_name = active.get("file_name")
     else:
         reset_conversation_state()
     return True
 
 
+def logout(email: str):
+    """Stash the user's conversations for a later login, then clear auth and chat state."""
+    # Save this user's conversations in the session cache so a later login can restore them
+    stash_conversations_for_user(email)
+    st.session_state.update(
+        user=None, tokens=None, verified_user_id=None, uploads=[], upload_history_loaded=False
+    )
+    reset_conversation_state()
+    clear_auth_query_params()
+
+
 # ---- File upload history helpers ----
 
 
+# Bumped whenever someone forces a refresh (e.g. after an upload) so every
+# session's next read misses the shared cache below.
+_upload_history_version = 0
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_upload_history(version: int):
+    """
+    Upload history as returned by the backend, shared across sessions.
+    The list is global (not per user), so one fetch serves every admin.
+    """
+    # Import locally to avoid circular imports at module load time
+    from frontend.api import api_get
+
+    return [Upload.from_api(raw) for raw in api_get("/files/history").get("files", [])]
+
+
 def fetch_upload_history(force_refresh: bool = False):
     """
     Fetch uploaded file history from the backend and cache it in session_state.
     Set force_refresh=True to ignore the cached list.
     """
-    if (
-        st.session_state.upload_history_loaded
-        and st.session_state.get("uploads")
-        and not force_refresh
-    ):
-        return st.session_state.uploads
+    global _upload_history_version
+    ss = st.session_state
+    if ss.upload_history_loaded and not force_refresh:
+        return ss.uploads
 
-    # Import locally to avoid circular imports at module load time
-    from frontend.api import api_get
+    if force_refresh:
+        _upload_history_version += 1
 
     try:
-        resp = api_get("/files/history")
-        st.session_state.uploads = resp.get("files", [])
-        st.session_state.upload_history_loaded = True
+        ss.uploads = _cached_upload_history(_upload_history_version)
+        ss.upload_history_loaded = True
     except Exception:
-        st.session_state.upload_history_loaded = False
+        ss.upload_history_loaded = False
         raise
 
-    return st.session_state.uploads
+    return ss.uploads
 
 
 # ---- Lightweight auth persistence across refresh ----
@@ -215,14 +323,14 @@ def fetch_upload_history(force_refresh: bool = False):
 
 def _encode_auth_payload(user: dict, tokens: Optional[dict]) -> str:
     payload = {"user": user, "tokens": tokens}
-    raw = json.dumps(payload).encode("utf-8")
+    raw = _dumps(payload)
     return base64.urlsafe_b64encode(raw).decode("ascii")
 
 
 def _decode_auth_payload(value: str) -> Optional[dict]:
     try:
         raw = base64.urlsafe_b64decode(value.encode("ascii"))
-        return json.loads(raw)
+        return _loads(raw)
     except Exception:
         return None
 
@@ -238,10 +346,12 @@ def hydrate_auth_from_query_params():
     encoded = params.get(AUTH_QUERY_KEY)
     if not encoded:
         return
-    payload = _decode_auth_payload(encoded[0] if isinstance(encoded, list) else encoded)
+    encoded = encoded[0] if isinstance(encoded, list) else encoded
+    payload = _decode_auth_payload(encoded)
     if payload and payload.get("user"):
         st.session_state.user = payload["user"]
         st.session_state.tokens = payload.get("tokens")
+        st.session_state._auth_qp_last = encoded
 
 
 def persist_auth_to_query_params():
@@ -250,9 +360,14 @@ def persist_auth_to_query_params():
     if not user:
         return
     encoded = _encode_auth_payload(user, st.session_state.get("tokens"))
+    # Writing query params pushes a URL update to the browser; skip it if nothing changed.
+    if st.session_state.get("_auth_qp_last") == encoded:
+        return
     st.query_params = {AUTH_QUERY_KEY: encoded}
+    st.session_state._auth_qp_last = encoded
 
 
 def clear_auth_query_params():
     """Remove auth payload from query params, used on logout."""
     st.query_params = {}
+    st.session_state._auth_qp_last = None
@@ -1,6 +1,5 @@
 """Auth page rendering (login + register)."""
 import httpx
-from pydantic import ValidationError
 import streamlit as st
 
 from frontend.api import api_post
@@ -31,14 +30,13 @@ def show_auth_page():
                 # backend returns: {"user": {"id": ..., "email": ...}, "tokens": {...}}
                 st.session_state.user = data["user"]
                 st.session_state.tokens = data.get("tokens")
+                st.session_state.verified_user_id = data["user"]["id"]
                 persist_auth_to_query_params()
                 # Restore prior conversations for this user if cached; otherwise start fresh
-                if not restore_conversations_for_user(st.session_state.user["email"]):
+                if not restore_conversations_for_user(data["user"]["email"], user_id=data["user"]["id"]):
                     reset_conversation_state()
                 st.toast("Login successful", icon="\U00002705")
                 st.rerun()
-            except ValidationError as ve:
-                st.error(f"Invalid email: {ve}")
             except httpx.HTTPStatusError as he:
                 try:
                     detail = he.response.json().get("detail", str(he))
@@ -74,6 +72,7 @@ def show_auth_page():
                     st.success("Registration successful. You can log in now.")
                     st.session_state.user = resp["user"]
                     st.session_state.tokens = resp.get("tokens")
+                    st.session_state.verified_user_id = resp["user"]["id"]
                     persist_auth_to_query_params()
                     reset_conversation_state()
                     st.toast("Registration successful", icon="\U00002705")
@@ -1,19 +1,47 @@
 """Main chat + upload workflow rendering."""
 import streamlit as st
 
-from frontend.api import api_post, api_upload_file
-from frontend.models import ChatResponse
+from frontend.api import api_stream_chat, api_upload_file
+from frontend.models import Upload
 from frontend.state import (
     fetch_upload_history,
-    get_active_conversation,
     maybe_update_conversation_title_from_prompt,
     update_active_conversation_metadata,
 )
 
+# How many of the latest messages are rendered by default
+HISTORY_WINDOW = 50
+# Messages kept per conversation; older ones are dropped to bound session memory
+MAX_HISTORY = 500
+
+
+def _upload_options(uploads):
+    """
+    Selectbox labels for the upload list, plus label -> upload and
+    file id -> label maps. Rebuilt only when the list object or its length
+    changes, not on every chat rerun.
+    """
+    cached = st.session_state.get("_upload_options")
+    if cached and cached[0] is uploads and cached[1] == len(uploads):
+        return cached[2]
+
+    options = ["All documents"]
+    option_map = {"All documents": None}
+    id_to_label = {}
+    for upload in uploads:
+        label = f"{upload.filename or f'File #{upload.id}'} (#{upload.id})"
+        options.append(label)
+        option_map[label] = upload
+        id_to_label.setdefault(upload.id, label)
+
+    built = (options, option_map, id_to_label)
+    st.session_state._upload_options = (uploads, len(uploads), built)
+    return built
+
 
 def render_upload_step(active_conv):
     """Render upload UI and sync file metadata into conversation state."""
-    role = (st.session_state.user or {}).get("role", "user")
+    role = st.session_state.user_role
     if role != "admin":
         st.info("Only admins can upload documents. Please ask an admin to upload files.")
         return
@@ -45,18 +73,17 @@ def render_upload_step(active_conv):
                 st.session_state.file_name = uploaded_file.name
 
                 # Reset chat when new file is uploaded for this conversation
-                st.session_state.messages = []
-                active_conv["messages"] = st.session_state.messages
+                st.session_state.messages.clear()
 
                 # Track uploads for admin sidebar history (newest first)
                 st.session_state.uploads.insert(
                     0,
-                    {
-                        "id": st.session_state.file_id,
-                        "filename": st.session_state.file_name,
-                        "chunk_count": resp.get("chunks_stored"),
-                        "size_bytes": uploaded_file.size,
-                    },
+                    Upload(
+                        id=st.session_state.file_id,
+                        filename=st.session_state.file_name,
+                        chunk_count=resp.get("chunks_stored"),
+                        size_bytes=uploaded_file.size,
+                    ),
                 )
                 st.session_state.upload_history_loaded = True
 
@@ -90,7 +117,7 @@ def render_upload_step(active_conv):
 
 def render_chat_step():
     """Render chat UI for the uploaded file."""
-    role = (st.session_state.user or {}).get("role", "user")
+    role = st.session_state.user_role
     if role == "admin":
         st.info("Chat is available only to users. Switch to a user account to ask questions.")
         return
@@ -105,35 +132,21 @@ def render_chat_step():
         uploads = st.session_state.get("uploads", [])
         st.warning(f"Could not load uploaded files: {e}")
 
-    active_conv = get_active_conversation()
-
     def set_active_file(file_id, file_name):
         """Update the active conversation's target file and clear chat if it changed."""
+        # The selectbox re-reports the current choice on every rerun
+        if file_id == st.session_state.file_id and file_name == st.session_state.file_name:
+            return
         if file_id != st.session_state.file_id:
-            st.session_state.messages = []
-            if active_conv:
-                active_conv["messages"] = st.session_state.messages
+            st.session_state.messages.clear()
         st.session_state.file_id = file_id
         st.session_state.file_name = file_name
         update_active_conversation_metadata()
 
     # Document selector
     if uploads:
-        options = ["All documents"]
-        option_map = {"All documents": None}
-        for upload in uploads:
-            file_id = upload.get("id") or upload.get("file_id")
-            name = upload.get("filename") or upload.get("file_name") or f"File #{file_id}"
-            label = f"{name} (#{file_id})"
-            options.append(label)
-            option_map[label] = upload
-
-        default_label = "All documents"
-        if st.session_state.file_id:
-            for label, upload in option_map.items():
-                if upload and (upload.get("id") == st.session_state.file_id or upload.get("file_id") == st.session_state.file_id):
-                    default_label = label
-                    break
+        options, option_map, id_to_label = _upload_options(uploads)
+        default_label = id_to_label.get(st.session_state.file_id, "All documents")
 
         selection = st.selectbox(
             "Choose which uploaded file to chat about",
@@ -144,20 +157,26 @@ def render_chat_step():
 
         chosen_upload = option_map.get(selection)
         if chosen_upload:
-            target_id = chosen_upload.get("id") or chosen_upload.get("file_id")
-            set_active_file(target_id, chosen_upload.get("filename") or chosen_upload.get("file_name"))
+            set_active_file(chosen_upload.id, chosen_upload.filename)
             chunk_info = ""
-            if chosen_upload.get("chunk_count") is not None:
-                chunk_info = f"({chosen_upload.get('chunk_count')} chunks indexed)"
-            st.caption(f"Answering using: {chosen_upload.get('filename') or chosen_upload.get('file_name')} {chunk_info}")
+            if chosen_upload.chunk_count is not None:
+                chunk_info = f"({chosen_upload.chunk_count} chunks indexed)"
+            st.caption(f"Answering using: {chosen_upload.filename} {chunk_info}")
         else:
             set_active_file(None, None)
             st.caption("No file pinned. I'll search across all admin-uploaded documents.")
     else:
         st.info("No uploaded documents found. Ask an admin to upload one.")
 
-    # Render chat history for this conversation
-    for role, content in st.session_state.messages:
+    # Render chat history for this conversation. Streamlit re-sends every element
+    # on each rerun, so long chats only show the latest messages unless asked.
+    messages = st.session_state.messages
+    hidden = len(messages) - HISTORY_WINDOW
+    if hidden > 0 and not st.toggle(
+        f"Show {hidden} earlier messages", key=f"show_all_{st.session_state.active_conv_id}"
+    ):
+        messages = messages[hidden:]
+    for role, content in messages:
         with st.chat_message(role):
             st.markdown(content)
 
@@ -167,30 +186,26 @@ def render_chat_step():
         maybe_update_conversation_title_from_prompt(prompt)
 
         # Store user message
+        # st.session_state.messages is the active conversation's own list
         st.session_state.messages.append(("user", prompt))
-        active_conv = get_active_conversation()
-        if active_conv:
-            active_conv["messages"] = st.session_state.messages  # keep reference in sync
 
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        # Call backend chat API
-        try:
-            payload = {"message": prompt}
-            # If a specific file was chosen in this session, include it; otherwise backend searches all files.
-            if st.session_state.file_id:
-                payload["file_id"] = st.session_state.file_id
-            # optionally: "user_id": st.session_state.user["id"]
-            data = api_post("/chat", payload)
-            bot_reply = ChatResponse(**data).reply
-        except Exception as e:
-            bot_reply = f"Error contacting API: {e}"
+        # Call backend chat API, rendering the answer as it streams in
+        with st.chat_message("assistant"):
+            try:
+                payload = {"message": prompt}
+                # If a specific file was chosen in this session, include it; otherwise backend searches all files.
+                if st.session_state.file_id:
+                    payload["file_id"] = st.session_state.file_id
+                # optionally: "user_id": st.session_state.user["id"]
+                bot_reply = st.write_stream(api_stream_chat("/chat/stream", payload))
+            except Exception as e:
+                bot_reply = f"Error contacting API: {e}"
+                st.markdown(bot_reply)
 
         # Store assistant message
         st.session_state.messages.append(("assistant", bot_reply))
-        if active_conv:
-            active_conv["messages"] = st.session_state.messages
-
-        with st.chat_message("assistant"):
-            st.markdown(bot_reply)
+        # Trim in place so the conversation keeps sharing this list
+        del st.session_state.messages[:-MAX_HISTORY]
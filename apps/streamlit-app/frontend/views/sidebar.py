@@ -9,16 +9,24 @@ from frontend.state import (
 )
 
 
+def _conversation_label(conv_id: int) -> str:
+    return st.session_state.conversations_by_id[conv_id]["title"] or "Untitled chat"
+
+
+def _on_conversation_picked():
+    load_conversation(st.session_state.conv_picker)
+
+
 def render_sidebar_history():
     """Show conversation list for users or uploads list for admins."""
-    role = (st.session_state.user or {}).get("role", "user")
+    role = st.session_state.user_role
     if role == "admin":
         st.header("Uploaded files")
         if st.button("+ Upload new file", key="new_upload_btn", use_container_width=True, type="primary"):
             # Clear current selection so the main uploader is ready for a new file
             st.session_state.file_id = None
             st.session_state.file_name = None
-            st.session_state.messages = []
+            st.session_state.messages.clear()
             update_active_conversation_metadata()
             # Bump uploader_key to force Streamlit to render a fresh file_uploader widget
             st.session_state.uploader_key = st.session_state.get("uploader_key", 0) + 1
@@ -34,21 +42,21 @@ def render_sidebar_history():
 
         if uploads:
             for upload in uploads:
-                file_id = upload.get("id") or upload.get("file_id")
+                file_id = upload.id
                 if not file_id:
                     continue
-                label = upload.get("filename") or upload.get("file_name") or f"File #{file_id}"
+                label = upload.filename or f"File #{file_id}"
                 meta = []
-                if upload.get("chunk_count") is not None:
-                    meta.append(f"{upload.get('chunk_count')} chunks")
-                if upload.get("size_bytes") is not None:
-                    meta.append(f"{upload.get('size_bytes')} bytes")
+                if upload.chunk_count is not None:
+                    meta.append(f"{upload.chunk_count} chunks")
+                if upload.size_bytes is not None:
+                    meta.append(f"{upload.size_bytes} bytes")
                 meta_text = " | ".join(meta)
                 button_label = f"{label} (#{file_id})"
                 if st.button(button_label, key=f"upload_{file_id}", type="secondary", help=meta_text or None):
                     st.session_state.file_id = file_id
-                    st.session_state.file_name = upload.get("filename") or upload.get("file_name")
-                    st.session_state.messages = []
+                    st.session_state.file_name = upload.filename
+                    st.session_state.messages.clear()
                     update_active_conversation_metadata()
                     st.rerun()
         else:
@@ -56,15 +64,20 @@ def render_sidebar_history():
     else:
         st.header("Chat history")
 
-        # List conversations (local only for now)
-        if st.session_state.conversations:
-            for conv in st.session_state.conversations:
-                label = conv["title"] or "Untitled chat"
-                is_active = conv["id"] == st.session_state.active_conv_id
-                button_label = f"-> {label}" if is_active else label
-                if st.button(button_label, key=f"conv_btn_{conv['id']}", type="secondary"):
-                    load_conversation(conv["id"])
-                    st.rerun()
+        # List conversations (local only for now) as one radio instead of a button each
+        conv_ids = [conv["id"] for conv in st.session_state.conversations]
+        if conv_ids:
+            # Point the picker at the active chat before it renders (e.g. after "+ New chat")
+            if st.session_state.active_conv_id in st.session_state.conversations_by_id:
+                st.session_state.conv_picker = st.session_state.active_conv_id
+            st.radio(
+                "Chat history",
+                conv_ids,
+                key="conv_picker",
+                format_func=_conversation_label,
+                on_change=_on_conversation_picked,
+                label_visibility="collapsed",
+            )
         else:
             st.info("No chats yet. Start by uploading a document and asking a question.")
 
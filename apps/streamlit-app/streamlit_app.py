@@ -5,14 +5,19 @@ from frontend.state import (
     ensure_base_state,
     ensure_conversation_state,
     get_active_conversation,
-    clear_auth_query_params,
     hydrate_auth_from_query_params,
-    stash_conversations_for_user,
+    logout,
 )
 from frontend.views.auth import show_auth_page
 from frontend.views.chat import render_chat_step, render_upload_step
 from frontend.views.sidebar import render_sidebar_history
 
+
+def _on_logout(email: str):
+    logout(email)
+    st.toast("Logged out", icon="\u2705")
+
+
 # ---------- Layout + main app ----------
 
 st.set_page_config(
@@ -44,36 +49,22 @@ if not active_conv:
     active_conv = get_active_conversation()
 
 # ---------- Top bar: Title + Account details ----------
-top_col1, top_col2 = st.columns([4, 3])
+# Title, account details and logout in one row (no nested columns)
+title_col, info_col, logout_col = st.columns([20, 9, 6])
+email = st.session_state.user["email"]
+role = st.session_state.user_role
 
-with top_col1:
+with title_col:
     st.title("AI ChatBot")
 
-with top_col2:
-    email = st.session_state.user["email"]
-    role = st.session_state.user.get("role", "user")
-    info_col1, info_col2 = st.columns([3, 2])
-    with info_col1:
-        st.write("Logged in")
-        st.write(f"**{email}**")
-        st.caption(f"Role: {role}")
-    with info_col2:
-        if st.button("Logout", key="logout_btn"):
-            # Save this user's conversations in the session cache so a later login can restore them
-            stash_conversations_for_user(email)
-            # Clear all state on logout
-            st.session_state.user = None
-            st.session_state.tokens = None
-            st.session_state.conversations = []
-            st.session_state.active_conv_id = None
-            st.session_state.messages = []
-            st.session_state.file_id = None
-            st.session_state.file_name = None
-            st.session_state.uploads = []
-            st.session_state.upload_history_loaded = False
-            clear_auth_query_params()
-            st.toast("Logged out", icon="\u2705")
-            st.rerun()
+with info_col:
+    st.write("Logged in")
+    st.write(f"**{email}**")
+    st.caption(f"Role: {role}")
+
+with logout_col:
+    # Runs before the next rerun, which then stops at the auth page straight away
+    st.button("Logout", key="logout_btn", on_click=_on_logout, args=(email,))
 
 # ---------- Steps ----------
 if role == "admin":